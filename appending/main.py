@@ -1,7 +1,198 @@
+import os
+import sys
+import time
 import h5py
 import argparse
 import numpy as np
-from tqdm import trange
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+# note: makes the shared h5py_examples package importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from h5py_examples import tuning  # noqa: E402
+from h5py_examples.appender import BufferedAppender  # noqa: E402
+from h5py_examples import instrument  # noqa: E402
+from h5py_examples import bench  # noqa: E402
+
+
+def create_appendable_dataset(h5f, name, config=None):
+    # create an empty dataset of floats
+    # note: maxshape is used to define which dimensions can be resized
+    dataset = h5f.create_dataset(name=name,
+                                 shape=(0, 42),
+                                 maxshape=(None, 42),
+                                 dtype='f4',
+                                 **tuning.dataset_kwargs(config))
+
+    # record the tuned configuration, if any
+    tuning.record_tuning(dataset, config)
+
+    return dataset
+
+
+def batch_starts(length, batch_size, progress=False):
+    # first row of each batch, optionally with a progress bar
+    # note: tqdm is only imported when the bar is shown
+    if not progress:
+        return range(0, length, batch_size)
+
+    from tqdm import trange
+    return trange(0, length, batch_size, desc='appending')
+
+
+def append_per_batch(dataset, data, batch_size, progress=False):
+    length = len(data)
+    steps = batch_starts(length, batch_size, progress)
+
+    # iterate over data, appending to dataset
+    for _ in steps:
+        # compute new shape
+        current_length = dataset.shape[0]
+        new_length = min(current_length + batch_size, length)
+        new_shape = (new_length,) + dataset.shape[1:]
+
+        # resize dataset
+        dataset.resize(new_shape)
+
+        # get batch of data
+        batch = data[current_length:new_length, ...]
+
+        # append a batch of data
+        dataset[current_length:, ...] = batch
+
+
+def append_buffered(dataset, data, batch_size, progress=False):
+    length = len(data)
+    steps = batch_starts(length, batch_size, progress)
+
+    # rows are staged and the dataset grows geometrically
+    # note: closing the appender flushes the buffer and trims the dataset
+    with BufferedAppender(dataset) as appender:
+        for start in steps:
+            appender.append(data[start:start + batch_size, ...])
+
+
+def random_rows(start, stop):
+    # rows [start, stop) of random data, generated in the shard workers
+    return np.random.default_rng(start).random((stop - start, 42), dtype='f4')
+
+
+def benchmark(args):
+    data = np.random.rand(args.length, 42).astype('f4')
+    methods = {'per-batch': append_per_batch, 'buffered': append_buffered}
+
+    print(f'{"batch size":>10} {"method":>10} {"rows/s":>14} {"time (s)":>10}')
+
+    for batch_size in args.benchmark_batch_sizes:
+        for method_name, method in methods.items():
+            # start from an empty file on each run
+            with h5py.File(args.filename, 'w') as h5f:
+                dataset = create_appendable_dataset(h5f, args.dataset_name)
+
+                start = time.perf_counter()
+                method(dataset, data, batch_size)
+                h5f.flush()
+                elapsed = time.perf_counter() - start
+
+                assert dataset.shape == data.shape
+
+            print(f'{batch_size:>10} {method_name:>10} '
+                  f'{args.length / elapsed:>14,.0f} {elapsed:>10.3f}')
+
+
+def random_access(rng, length, block_rows, reads, zipf=None):
+    # uniform rows, or rows of blocks drawn with zipfian popularity
+    if zipf is None:
+        return rng.integers(0, length, reads)
+
+    blocks = -(-length // block_rows)
+    ranks = (rng.zipf(zipf, reads) - 1) % blocks
+    rows = rng.permutation(blocks)[ranks] * block_rows + rng.integers(0, block_rows, reads)
+    return np.minimum(rows, length - 1)
+
+
+# cache shared by the benchmark processes, set when they start
+# note: the cache holds a lock, which processes can only inherit
+shared_cache = None
+
+
+def attach_cache(cache):
+    global shared_cache
+    shared_cache = cache
+
+
+def read_rows(filename, dataset_name, rows):
+    # reads rows through the cache shared with the other processes
+    from h5py_examples.chunkcache import CachedDataset
+
+    with h5py.File(filename, 'r') as h5f:
+        dataset = CachedDataset(h5f[dataset_name], cache=shared_cache)
+        for row in rows:
+            dataset[row]
+        return dataset.hits, dataset.misses
+
+
+def benchmark_reads(args):
+    # note: feature modules are imported by the modes using them, so the
+    # other modes and --help start faster
+    from h5py_examples.chunkcache import CACHE_POLICIES, SharedBlockCache, open_cached
+
+    budget = args.cache_budget * 2 ** 20
+
+    # compressed dataset, as appended by the examples
+    # note: random rows decompress a whole chunk each time they miss
+    with h5py.File(args.filename, 'w') as h5f:
+        dataset = h5f.create_dataset(name=args.dataset_name, shape=(args.length, 42),
+                                     dtype='f4', chunks=(1024, 42),
+                                     compression='gzip', shuffle=True)
+        for start in range(0, args.length, 65536):
+            dataset[start:start + 65536] = random_rows(start, min(start + 65536, args.length))
+
+    print(f'{"access":>8} {"reader":>12} {"rows/s":>12} {"hit rate":>9}')
+
+    rng = np.random.default_rng(0)
+    for access, zipf in (('uniform', None), ('zipf', args.zipf)):
+        rows = random_access(rng, args.length, 1024, args.benchmark_reads, zipf)
+
+        # hdf5 reads with its default and with a tuned chunk cache
+        for reader, rdcc in (('hdf5', None), ('hdf5 rdcc', budget)):
+            h5f, cached = open_cached(args.filename, args.dataset_name, rdcc=rdcc)
+            with h5f:
+                start = time.perf_counter()
+                for row in rows:
+                    cached.dataset[row]
+                elapsed = time.perf_counter() - start
+            print(f'{access:>8} {reader:>12} {len(rows) / elapsed:>12,.0f} {"-":>9}')
+
+        # decoded blocks cached by the application
+        for policy in CACHE_POLICIES:
+            h5f, cached = open_cached(args.filename, args.dataset_name,
+                                      budget=budget, policy=policy)
+            with h5f:
+                start = time.perf_counter()
+                for row in rows:
+                    cached[row]
+                elapsed = time.perf_counter() - start
+            print(f'{access:>8} {policy:>12} {len(rows) / elapsed:>12,.0f} '
+                  f'{cached.hit_rate:>9.2%}')
+
+        # processes sharing one cache in shared memory
+        cache = SharedBlockCache(max(budget // (1024 * 42 * 4), 1), (1024, 42), 'f4')
+        try:
+            workers = os.cpu_count()
+            start = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=workers, initializer=attach_cache,
+                                     initargs=(cache,)) as executor:
+                results = list(executor.map(read_rows, [args.filename] * workers,
+                                            [args.dataset_name] * workers,
+                                            np.array_split(rows, workers)))
+            elapsed = time.perf_counter() - start
+        finally:
+            cache.close()
+        hits, misses = np.sum(results, axis=0)
+        print(f'{access:>8} {"shared":>12} {len(rows) / elapsed:>12,.0f} '
+              f'{hits / max(hits + misses, 1):>9.2%}')
 
 
 def main():
@@ -14,35 +205,81 @@ def main():
                         help='length of the hdf5 dataset', default=int(1e6))
     parser.add_argument('-bs', '--batch-size', type=int,
                         help='length of the batch appended to the dataset', default=10)
+    parser.add_argument('-m', '--mode', type=str, choices=['per-batch', 'buffered', 'sharded'],
+                        help='resize the dataset on every batch, append through a buffer, '
+                             'or append to shards in parallel processes',
+                        default='buffered')
+    parser.add_argument('-n', '--shards', type=int,
+                        help='shard files written in parallel by the sharded mode')
+    parser.add_argument('-c', '--compact', action='store_true',
+                        help='copy the shards into a single file after the sharded mode')
+    parser.add_argument('-b', '--benchmark', action='store_true',
+                        help='compare rows/s of the append modes')
+    parser.add_argument('-bbs', '--benchmark-batch-sizes', type=int, nargs='+',
+                        help='batch sizes used by the benchmark', default=[1, 10, 100, 1000])
+    parser.add_argument('-bR', '--benchmark-reads', type=int,
+                        help='random row reads of the cached read benchmark, run instead of '
+                             'the append benchmark when given')
+    parser.add_argument('-cb', '--cache-budget', type=int,
+                        help='megabytes of decoded chunks cached by the read benchmark',
+                        default=16)
+    parser.add_argument('-z', '--zipf', type=float,
+                        help='exponent of the skewed access of the read benchmark', default=1.2)
+    parser.add_argument('-t', '--tune', action='store_true',
+                        help='pick chunk shape and compression from a trial on the data')
+    parser.add_argument('-a', '--access', type=str, choices=tuning.ACCESS_PATTERNS,
+                        help='access pattern the dataset is tuned for', default='rows')
+    instrument.add_arguments(parser)
+    bench.add_arguments(parser)
     args = parser.parse_args()
 
-    # open hdf5 file in write mode
-    with h5py.File(args.filename, 'w') as h5f:
-        # create random data to be stored
-        data = np.random.rand(args.length, 42)
-
-        # create an empty dataset of floats
-        # note: maxshape is used to define which dimensions can be resized
-        dataset = h5f.create_dataset(name=args.dataset_name,
-                                     shape=(0, 42),
-                                     maxshape=(None, 42),
-                                     dtype='f4')
-
-        # iterate over data, appending to dataset
-        for _ in trange(0, args.length, args.batch_size, desc='appending'):
-            # compute new shape
-            current_length = dataset.shape[0]
-            new_length = min(current_length + args.batch_size, args.length)
-            new_shape = (new_length,) + dataset.shape[1:]
-
-            # resize dataset
-            dataset.resize(new_shape)
-
-            # get batch of data
-            batch = data[current_length:new_length, ...]
-
-            # append a batch of data
-            dataset[current_length:, ...] = batch
+    instrument.from_args(args)
+    bench.from_args(args)
+
+    if args.benchmark_reads:
+        benchmark_reads(args)
+        return
+
+    if args.benchmark:
+        benchmark(args)
+        return
+
+    if args.mode == 'sharded':
+        from h5py_examples.sharded import write_sharded
+
+        # each worker generates, compresses and writes its own shard file
+        # note: the shards are stitched into a virtual dataset in filename
+        config = tuning.tune(random_rows(0, min(args.length, 16384)), access=args.access,
+                             maxshape=(None, 42)) if args.tune else None
+        with bench.timed():
+            start = time.perf_counter()
+            filenames = write_sharded(args.filename, args.dataset_name, random_rows, args.length,
+                                      shards=args.shards, batch_size=args.batch_size,
+                                      config=config, compact=args.compact)
+            elapsed = time.perf_counter() - start
+        print(f'{len(filenames)} shards written in {elapsed:.3f}s, '
+              f'{args.length / elapsed:,.0f} rows/s')
+    else:
+        # open hdf5 file in write mode
+        with h5py.File(args.filename, 'w') as h5f:
+            # create random data to be stored
+            data = np.random.rand(args.length, 42)
+
+            # optionally tune chunking and filters on a sample of the data
+            config = tuning.tune(data, dtype='f4', access=args.access,
+                                 maxshape=(None, 42)) if args.tune else None
+            if config is not None:
+                print('tuned:', tuning.dataset_kwargs(config))
+
+            # create an empty resizable dataset
+            dataset = create_appendable_dataset(h5f, args.dataset_name, config)
+
+            # append data batch by batch
+            with bench.timed():
+                if args.mode == 'buffered':
+                    append_buffered(dataset, data, args.batch_size, progress=True)
+                else:
+                    append_per_batch(dataset, data, args.batch_size, progress=True)
 
     # open hdf5 file in read mode
     with h5py.File(args.filename, 'r') as h5f:
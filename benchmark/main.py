@@ -0,0 +1,188 @@
+import os
+import sys
+import argparse
+import itertools
+import numpy as np
+from pathlib import Path
+
+# note: makes the shared h5py_examples package importable when run as a script
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from h5py_examples import bench  # noqa: E402
+
+
+EXAMPLES = ('simple', 'appending', 'swmr', 'ragged', 'string',
+            'virtual_dataset', 'convert_dataset')
+
+
+def grid(args):
+    # (case name, example, argv, items) of every run
+    # note: items are the rows or elements written, used for the throughput
+    cases = []
+    for shape in args.shapes:
+        dims = [int(n) for n in shape.split('x')]
+        cases.append((f'simple[shape={shape}]', 'simple',
+                      ['-s'] + [str(n) for n in dims], int(np.prod(dims))))
+
+    for example in ('appending', 'swmr'):
+        for length, batch_size in itertools.product(args.lengths, args.batch_sizes):
+            cases.append((f'{example}[length={length},batch_size={batch_size}]', example,
+                          ['-l', str(length), '-bs', str(batch_size)], length))
+
+    # note: arrays and strings are generated by the examples, passing them
+    # as arguments would hit the argument size limit of the system
+    for size in args.sizes:
+        cases.append((f'ragged[size={size}]', 'ragged', ['-g', str(size)], size))
+        cases.append((f'string[size={size}]', 'string', ['-g', str(size)], size))
+
+    for shards in args.shards:
+        lengths = [str(args.shard_rows)] * shards
+        cases.append((f'virtual_dataset[shards={shards}]', 'virtual_dataset',
+                      ['-ls'] + lengths, shards * args.shard_rows))
+
+    # note: the conversion has no input of its own, it converts synthetic
+    # images and labels, untuned
+    for length in args.lengths:
+        cases.append((f'convert_dataset[length={length}]', 'convert_dataset',
+                      ['-g', str(length)], length))
+
+    return [case for case in cases if case[1] in args.examples]
+
+
+# modules the cli must not import before a subcommand runs
+HEAVY_MODULES = ('h5py', 'numpy', 'cv2', 'tqdm')
+
+# modules only some modes of an example need, which <example> --help must not import
+FEATURE_MODULES = ('cv2', 'tqdm', 'asyncio', 'h5py_examples.aio', 'h5py_examples.chunkcache',
+                   'h5py_examples.images', 'h5py_examples.loader', 'h5py_examples.sharded')
+
+
+def package_imports(code, repeat):
+    # imports of the h5py_examples package run by code, from the fastest of repeat runs
+    def run():
+        imports = bench.import_times(['-c', 'import sys; sys.path.insert(0, sys.argv[1]); '
+                                            + code, str(ROOT)])
+        # note: interpreter start-up imports come before the package
+        first = next(i for i, (module, *_) in enumerate(imports)
+                     if module.startswith('h5py_examples'))
+        return imports[first:]
+
+    return min((run() for _ in range(repeat)),
+               key=lambda imports: sum(own for _, _, own, _ in imports))
+
+
+def imported(imports, modules):
+    # modules, or their submodules, found in imports
+    return sorted({name for module, *_ in imports for name in modules
+                   if module == name or module.startswith(name + '.')})
+
+
+def startup(args):
+    # import time of the cli entry point, which must stay free of heavy modules
+    # note: the fastest of repeat runs is kept, as for the examples
+    imports = package_imports('from h5py_examples import cli', args.repeat)
+    total = sum(own for _, _, own, _ in imports) / 1e3
+
+    print(f'cli import time: {total:.1f} ms, {len(imports)} modules')
+    for module, _, own, _ in sorted(imports, key=lambda item: -item[2])[:5]:
+        print(f'{module:>32} {own / 1e3:>8.2f} ms')
+
+    failed = False
+    heavy = imported(imports, HEAVY_MODULES)
+    if heavy:
+        print('regression: the cli imports', ', '.join(heavy))
+        failed = True
+    if total > args.startup_limit:
+        print(f'regression: cli import time {total:.1f} ms > {args.startup_limit} ms')
+        failed = True
+
+    # import time of <example> --help, which must not import the modules of
+    # modes it does not run
+    # note: h5py and numpy are imported by every example, they are not checked
+    from h5py_examples.cli import EXAMPLES as SUBCOMMANDS
+
+    print(f'{"subcommand":>32} {"--help (ms)":>12} {"modules":>8}')
+    for name in SUBCOMMANDS:
+        imports = package_imports(f'from h5py_examples import cli; cli.main([{name!r}, "--help"])',
+                                  args.repeat)
+        total = sum(own for _, _, own, _ in imports) / 1e3
+        print(f'{name:>32} {total:>12.1f} {len(imports):>8}')
+
+        features = imported(imports, FEATURE_MODULES)
+        if features:
+            print(f'regression: {name} --help imports', ', '.join(features))
+            failed = True
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-e', '--examples', type=str, nargs='+', choices=EXAMPLES,
+                        help='examples to run', default=list(EXAMPLES))
+    parser.add_argument('-s', '--shapes', type=str, nargs='+',
+                        help='shapes of the simple dataset (i.e.: 1000x42)',
+                        default=['10000x42', '100000x42'])
+    parser.add_argument('-l', '--lengths', type=int, nargs='+',
+                        help='lengths of the appended datasets', default=[int(1e5)])
+    parser.add_argument('-bs', '--batch-sizes', type=int, nargs='+',
+                        help='batch sizes of the appended datasets', default=[10, 1000])
+    parser.add_argument('-sz', '--sizes', type=int, nargs='+',
+                        help='numbers of ragged arrays and strings', default=[10000, 50000])
+    parser.add_argument('-n', '--shards', type=int, nargs='+',
+                        help='numbers of virtual dataset shards', default=[4, 32])
+    parser.add_argument('-sr', '--shard-rows', type=int,
+                        help='rows of each virtual dataset shard', default=10000)
+    parser.add_argument('-r', '--repeat', type=int,
+                        help='runs per case, the fastest is kept', default=3)
+    parser.add_argument('-o', '--output', type=str,
+                        help='json file the results are written to', default='benchmark.json')
+    parser.add_argument('-bl', '--baseline', type=str,
+                        help='json file of a previous run to compare against')
+    parser.add_argument('-tt', '--time-threshold', type=float,
+                        help='allowed relative increase of the core path time', default=0.2)
+    parser.add_argument('-rt', '--rss-threshold', type=float,
+                        help='allowed relative increase of the peak rss', default=0.2)
+    parser.add_argument('-ft', '--size-threshold', type=float,
+                        help='allowed relative increase of the file size', default=0.05)
+    parser.add_argument('-st', '--startup', action='store_true',
+                        help='check the import time of the cli and of each subcommand --help '
+                             'instead of running the examples')
+    parser.add_argument('-sl', '--startup-limit', type=float,
+                        help='allowed import time of the cli in milliseconds', default=20.)
+    args = parser.parse_args()
+
+    if args.startup:
+        sys.exit(1 if startup(args) else 0)
+
+    print(f'{"case":<44} {"core (s)":>9} {"items/s":>11} {"process (s)":>11} '
+          f'{"rss (MB)":>9} {"size (MB)":>10}')
+
+    results = {}
+    for name, example, argv, items in grid(args):
+        script = os.path.join(ROOT, example, 'main.py')
+        result = results[name] = bench.run_case(script, argv, items, repeat=args.repeat)
+        print(f'{name:<44} {result["core_time"]:>9.3f} {result["throughput"]:>11.0f} '
+              f'{result["process_time"]:>11.3f} {result["peak_rss"] / 2 ** 20:>9.1f} '
+              f'{result["file_size"] / 2 ** 20:>10.2f}')
+
+    bench.save(args.output, results)
+    print('results written to', args.output)
+
+    if args.baseline is None:
+        return
+
+    # note: a non-zero exit code marks a regression, e.g. for ci
+    thresholds = {'core_time': args.time_threshold, 'peak_rss': args.rss_threshold,
+                  'file_size': args.size_threshold}
+    regressions = bench.compare(results, bench.load(args.baseline), thresholds)
+    for name, metric, before, after, ratio in regressions:
+        print(f'regression: {name} {metric} {before:.4g} -> {after:.4g} ({ratio:.2f}x)')
+
+    if regressions:
+        sys.exit(1)
+    print('no regressions against', args.baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,57 +1,156 @@
-import cv2
+import os
+import sys
+import time
+import itertools
 import h5py
 import argparse
+import tempfile
 import numpy as np
 from pathlib import Path
 
+# note: makes the shared h5py_examples package importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from h5py_examples import tuning  # noqa: E402
+from h5py_examples.catalog import print_h5f_content  # noqa: E402
+from h5py_examples.ingest import ColumnBlockWriter, pipeline, print_throughput  # noqa: E402
+from h5py_examples import instrument  # noqa: E402
+from h5py_examples import bench  # noqa: E402
+
+
+def convert_dataset_to_h5f(h5f, values, keyfn, extractors, block_size=1024, tune=None,
+                           workers=0, backend='thread', length=None,
+                           checkpoint_every=None, resume=False):
+    # get length of dataset, if known
+    # note: values can be any iterable, e.g. a generator, in which case the
+    # columns grow block by block
+    if length is None and hasattr(values, '__len__'):
+        length = len(values)
+
+    # rows are collected into per-column blocks before being written
+    with ColumnBlockWriter(h5f, length, block_size=block_size, tune=tune,
+                           checkpoint_every=checkpoint_every,
+                           resume=resume) as writer:
+        # skip values committed by a previous run
+        values = itertools.islice(values, writer.start, None)
+
+        # extract rows, serially or on a worker pool, in index order
+        # note: hdf5 is not thread-safe, so only this thread writes
+        for row, timings in pipeline(values, keyfn, extractors,
+                                     workers=workers, backend=backend):
+            for column_name, elapsed in timings.items():
+                writer.column_stats(column_name)['extract_time'] += elapsed
+
+            writer.append(row)
+
+    return writer.stats
+
+
+def synthetic_columns(seed=0):
+    # extractors of small random images and their labels
+    rng = np.random.default_rng(seed)
+    return {'image': lambda key: rng.integers(0, 255, (32, 32, 3), dtype=np.uint8),
+            'label': lambda key: key % 10}
+
+
+def benchmark(args):
+    # note: feature modules are imported by the modes using them, so the
+    # other modes and --help start faster
+    from h5py_examples.loader import ShuffledLoader
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'benchmark.h5')
+
+        # chunked, compressed columns of small images and labels
+        with h5py.File(filename, 'w') as h5f:
+            convert_dataset_to_h5f(h5f, range(args.benchmark_rows), lambda value: value,
+                                   synthetic_columns(), block_size=args.block_size,
+                                   tune='rows')
+
+        # naive random access, one sample per read
+        # note: capped, since each read decompresses a whole chunk
+        with h5py.File(filename, 'r') as h5f:
+            columns = [h5f['image'], h5f['label']]
+            indices = np.random.permutation(args.benchmark_rows)[:args.benchmark_samples]
+            start = time.perf_counter()
+            for index in indices:
+                [column[index] for column in columns]
+            naive = len(indices) / (time.perf_counter() - start)
+
+        loader = ShuffledLoader(filename, batch_size=args.benchmark_batch_size,
+                                workers=args.loader_workers)
+        start = time.perf_counter()
+        samples = sum(len(batch['label']) for batch in loader)
+        shuffled = samples / (time.perf_counter() - start)
+
+        print(f'{"loader":>10} {"samples/s":>12}')
+        print(f'{"naive":>10} {naive:>12.0f}')
+        print(f'{"shuffled":>10} {shuffled:>12.0f}')
+        print(f'speedup: {shuffled / naive:.1f}x')
+
+        # ranks must split the rows without overlap, at most a block apart
+        ranks = [ShuffledLoader(filename, rank=rank, world_size=args.world_size)
+                 for rank in range(args.world_size)]
+        rows = [np.concatenate([np.arange(start, stop) for start, stop in loader.blocks()]
+                               or [np.empty(0, dtype=np.int64)]) for loader in ranks]
+        counts = [len(rank_rows) for rank_rows in rows]
+        print(f'rows per rank: {counts}, block rows: {ranks[0].block_rows}')
+        if not np.array_equal(np.sort(np.concatenate(rows)), np.arange(args.benchmark_rows)):
+            raise RuntimeError('ranks overlap or miss rows')
+        if max(counts) - min(counts) > ranks[0].block_rows:
+            raise RuntimeError(f'ranks are unbalanced: {counts}')
+
+
+def synthetic_image(key, size=256):
+    # smooth gradient with noise, compressible like a photo
+    rng = np.random.default_rng(key)
+    y, x = np.mgrid[0:size, 0:size]
+    image = np.stack([x, y, x + y], axis=-1) * rng.random(3) * 255 / (2 * size)
+    return np.clip(image + rng.normal(0, 8, image.shape), 0, 255).astype(np.uint8)
+
+
+def benchmark_images(args):
+    # note: cv2 is an optional dependency, only the image benchmark needs it
+    from h5py_examples.images import EncodedImage, ImageReader, encode_image
+
+    with tempfile.TemporaryDirectory() as directory:
+        keys = range(args.benchmark_images)
+        encoded = EncodedImage(lambda key: encode_image(synthetic_image(key), args.image_format))
+        storages = {'decoded': {'image': synthetic_image},
+                    'encoded': encoded.columns('image')}
+
+        rng = np.random.default_rng(0)
+        batches = [np.sort(rng.choice(len(keys), args.benchmark_batch_size, replace=False))
+                   for _ in range(args.benchmark_batches)]
+
+        print(f'{"storage":>8} {"size (MB)":>10} {"write (s)":>10} {"images/s":>10}')
+        for storage, extractors in storages.items():
+            filename = os.path.join(directory, f'{storage}.h5')
+            start = time.perf_counter()
+            with h5py.File(filename, 'w') as h5f:
+                convert_dataset_to_h5f(h5f, keys, lambda value: value, extractors,
+                                       block_size=args.block_size)
+            write_time = time.perf_counter() - start
+
+            # random batches, read into one array
+            with h5py.File(filename, 'r') as h5f:
+                start = time.perf_counter()
+                if storage == 'decoded':
+                    # note: one read per image, fancy indexing is much slower
+                    dataset = h5f['image']
+                    out = np.empty((len(batches[0]),) + dataset.shape[1:], dtype=dataset.dtype)
+                    for batch in batches:
+                        for i, index in enumerate(batch):
+                            dataset.read_direct(out, np.s_[index], np.s_[i])
+                else:
+                    with ImageReader(h5f, 'image', workers=args.decode_workers) as reader:
+                        for batch in batches:
+                            reader.read(batch)
+                read_time = time.perf_counter() - start
+
+            print(f'{storage:>8} {os.path.getsize(filename) / 2 ** 20:>10.1f} '
+                  f'{write_time:>10.2f} {len(batches) * len(batches[0]) / read_time:>10.0f}')
 
-def print_h5f_content(h5f, depth=0):
-    # if h5f is a dataset
-    if isinstance(h5f, h5py.Dataset):
-        # print name, shape and dtype
-        print('  ' * depth,
-              f'{h5f.name}: shape {h5f.shape}, dtype {h5f.dtype}')
-    # if h5f is a group
-    elif isinstance(h5f, h5py.Group):
-        # get list of content
-        content = list(h5f.keys())
-        # print name, # of elements
-        print('  ' * depth, f'{h5f.name}: {len(content)} elements')
-        # recurse on content
-        for elem in content:
-            print_h5f_content(h5f[elem], depth + 1)
-    else:
-        raise ValueError(
-            f'print_h5f_content called with wrong type: {type(h5f)}')
-
-
-def convert_dataset_to_h5f(h5f, values, keyfn, extractors):
-    # get length of dataset
-    length = len(values)
-
-    # iterate over principal column values
-    for i, principal_value in enumerate(values):
-        # get key from current principal value
-        key = keyfn(principal_value)
-
-        # iterate over extractors
-        for column_name, extractor in extractors.items():
-            # get column value using extractor
-            column_value = extractor(key)
-
-            # if column does not exists inside h5f
-            if column_name not in h5f:
-                # get column attibutes
-                dtype = column_value.dtype
-                shape = column_value.shape
-
-                # create dataset column
-                h5f.create_dataset(name=column_name,
-                                   shape=(length,) + shape,
-                                   maxshape=(None,) + shape,
-                                   dtype=dtype)
-            
-            h5f[column_name][i] = column_value
 
 def main():
     parser = argparse.ArgumentParser()
@@ -59,19 +158,85 @@ def main():
                         help='name of the hdf5 file', default='default.h5')
     parser.add_argument('-bp', '--base-path', type=str,
                         help='base path for the dataset', default='.')
+    parser.add_argument('-t', '--tune', action='store_true',
+                        help='pick chunk shape and compression from a trial on the data')
+    parser.add_argument('-a', '--access', type=str, choices=tuning.ACCESS_PATTERNS,
+                        help='access pattern the columns are tuned for', default='rows')
+    parser.add_argument('-bs', '--block-size', type=int,
+                        help='rows per column block written at once', default=1024)
+    parser.add_argument('-w', '--workers', type=int,
+                        help='number of extractor workers, 0 extracts in the writer', default=0)
+    parser.add_argument('-be', '--backend', type=str, choices=['thread', 'process'],
+                        help='worker pool used by the extractors', default='thread')
+    parser.add_argument('-r', '--resume', action='store_true',
+                        help='continue an interrupted conversion instead of starting over')
+    parser.add_argument('-ce', '--checkpoint-every', type=int,
+                        help='rows written between progress checkpoints', default=100000)
+    parser.add_argument('-g', '--generate', type=int,
+                        help='convert this many synthetic images and labels instead')
+    parser.add_argument('-lw', '--loader-workers', type=int,
+                        help='processes prefetching batches for the benchmark loader', default=0)
+    parser.add_argument('-ws', '--world-size', type=int,
+                        help='ranks the benchmark checks the loader split for', default=3)
+    parser.add_argument('-b', '--benchmark', action='store_true',
+                        help='compare the shuffled loader with random reads of samples')
+    parser.add_argument('-br', '--benchmark-rows', type=int,
+                        help='rows of the benchmark dataset', default=200000)
+    parser.add_argument('-bn', '--benchmark-samples', type=int,
+                        help='samples read at random by the naive loader', default=5000)
+    parser.add_argument('-bb', '--benchmark-batch-size', type=int,
+                        help='batch size of the shuffled loader and image reader', default=256)
+    parser.add_argument('-bi', '--benchmark-images', type=int,
+                        help='compare decoded and encoded storage of this many images')
+    parser.add_argument('-bB', '--benchmark-batches', type=int,
+                        help='random batches read by the image benchmark', default=10)
+    parser.add_argument('-if', '--image-format', type=str, choices=['.png', '.jpg'],
+                        help='encoding of the image benchmark', default='.jpg')
+    parser.add_argument('-dw', '--decode-workers', type=int,
+                        help='threads decoding images, defaults to the number of cores')
+    instrument.add_arguments(parser)
+    bench.add_arguments(parser)
     args = parser.parse_args()
+
+    instrument.from_args(args)
+    bench.from_args(args)
     args.base_path = Path(args.base_path)
 
+    if args.benchmark_images:
+        benchmark_images(args)
+        return
+
+    if args.benchmark:
+        benchmark(args)
+        return
+
     # note: add logic here
+    # note: values can be a generator, so inputs larger than memory stream
+    # note: with --backend process, keyfn and extractors must be picklable
+    # note: images can be kept encoded, e.g. EncodedImage(read_file).columns('image')
+    # stores the jpeg or png bytes of each file, read back with ImageReader
     values = []
     extractors = {}
     def keyfn(value): return value
     # note: end
 
-    # open hdf5 file in write mode
-    with h5py.File(args.filename, 'w') as h5f:
+    # synthetic images and labels instead, e.g. for the benchmark runner
+    if args.generate:
+        values, extractors = range(args.generate), synthetic_columns()
+
+    # open hdf5 file in write mode, or append mode when resuming
+    with h5py.File(args.filename, 'a' if args.resume else 'w') as h5f, bench.timed():
         # converts dataset to hdf5
-        convert_dataset_to_h5f(h5f, values, keyfn, extractors)
+        stats = convert_dataset_to_h5f(h5f, values, keyfn, extractors,
+                                       block_size=args.block_size,
+                                       workers=args.workers,
+                                       backend=args.backend,
+                                       checkpoint_every=args.checkpoint_every,
+                                       resume=args.resume,
+                                       tune=args.access if args.tune else None)
+
+    # print per-column throughput
+    print_throughput(stats)
 
     # open hdf5 file in read mode
     with h5py.File(args.filename, 'r') as h5f:
@@ -1,6 +1,24 @@
+import sys
 import h5py
 import argparse
 import numpy as np
+from pathlib import Path
+
+# note: makes the shared h5py_examples package importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from h5py_examples.labeled import LabeledArray, attach_scales  # noqa: E402
+from h5py_examples import instrument  # noqa: E402
+
+
+def parse_indexer(text):
+    # parses a coordinate selection such as '1', '0.5' or '0:32'
+    def number(part):
+        return float(part) if '.' in part else int(part)
+
+    if ':' not in text:
+        return number(text)
+    return slice(*[number(part) if part else None for part in text.split(':')])
 
 
 def main():
@@ -12,8 +30,14 @@ def main():
     parser.add_argument('-ls', '--labeled-shape', action='append', nargs='+',
                         type=lambda kv: tuple(kv.split('=')), dest='labeled_shape',
                         help='labeled shape (i.e.: height=64 width=80 depth=3)')
+    parser.add_argument('-s', '--select', action='append', nargs='+',
+                        type=lambda kv: tuple(kv.split('=')), dest='select',
+                        help='coordinate selection (i.e.: height=0:32 depth=1)')
+    instrument.add_arguments(parser)
     args = parser.parse_args()
 
+    instrument.from_args(args)
+
     # convert labeled-shape to dict
     labeled_shape = dict(
         args.labeled_shape[0]) if args.labeled_shape is not None else dict()
@@ -39,6 +63,11 @@ def main():
         for label, dim in zip(labeled_shape.keys(), dataset.dims):
             dim.label = label
 
+        # attach a coordinate array to each dimension
+        # note: coordinates must be sorted, they are looked up by binary search
+        attach_scales(dataset, {label: np.arange(length)
+                                for label, length in labeled_shape.items()})
+
     # open hdf5 file in read mode
     with h5py.File(args.filename, 'r') as h5f:
         # select dataset
@@ -47,6 +76,13 @@ def main():
         # print dataset dimension labels
         print('dimension labels:', *[dim.label for dim in dataset.dims])
 
+        # select by coordinates, the data is read with a single hyperslab
+        if args.select is not None:
+            indexers = {k: parse_indexer(v) for k, v in args.select[0]}
+            selection = LabeledArray(dataset).sel(**indexers)
+            print('selection:', selection, selection.hyperslab())
+            print('selected shape:', selection.read().shape)
+
 
 if __name__ == '__main__':
     main()
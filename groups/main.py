@@ -1,26 +1,14 @@
+import sys
 import h5py
 import argparse
 import numpy as np
+from pathlib import Path
 
+# note: makes the shared h5py_examples package importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-def print_h5f_content(h5f, depth=0):
-    # if h5f is a dataset
-    if isinstance(h5f, h5py.Dataset):
-        # print name, shape and dtype
-        print('  ' * depth,
-              f'{h5f.name}: shape {h5f.shape}, dtype {h5f.dtype}')
-    # if h5f is a group
-    elif isinstance(h5f, h5py.Group):
-        # get list of content
-        content = list(h5f.keys())
-        # print name, # of elements
-        print('  ' * depth, f'{h5f.name}: {len(content)} elements')
-        # recurse on content
-        for elem in content:
-            print_h5f_content(h5f[elem], depth + 1)
-    else:
-        raise ValueError(
-            f'print_h5f_content called with wrong type: {type(h5f)}')
+from h5py_examples.catalog import load_catalog, print_h5f_content  # noqa: E402
+from h5py_examples import instrument  # noqa: E402
 
 
 def main():
@@ -32,8 +20,13 @@ def main():
                         default=['dataset1', 'dataset2',
                                  'group1/dataset3', 'group1/dataset4',
                                  'group2/subgroup1/subssubgroup1/dataset5'])
+    parser.add_argument('-q', '--query', type=str,
+                        help='glob of object paths to list (i.e.: "/group1/*")')
+    instrument.add_arguments(parser)
     args = parser.parse_args()
 
+    instrument.from_args(args)
+
     # open hdf5 file in write mode
     with h5py.File(args.filename, 'w') as h5f:
         # iterate over dataset names
@@ -42,10 +35,19 @@ def main():
             dataset = h5f.create_dataset(name=dataset_name,
                                          dtype='i8')
 
+    # load the catalog of the file
+    # note: the catalog is built with a single pass over the file and cached
+    # next to it, later runs load it without walking the file
+    catalog = load_catalog(args.filename)
+
+    # list objects matching the query
+    if args.query is not None:
+        print(*catalog.query(args.query), sep='\n')
+
     # open hdf5 file in read mode
     with h5py.File(args.filename, 'r') as h5f:
         # print file structure
-        print_h5f_content(h5f)
+        print_h5f_content(h5f, catalog)
 
         # visit explores the tree in order
         # note: visititems is equivalent to visit but passes both h5f_name and h5f
@@ -0,0 +1,126 @@
+import zlib
+import h5py
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+# file pool of the current worker thread or process
+_local = threading.local()
+
+
+class FilePool:
+    # lru pool of open files, closing the least recently used beyond max_open
+    def __init__(self, max_open=64):
+        self.max_open = max_open
+        self.files = OrderedDict()
+        self.opens = 0
+        self.evictions = 0
+
+    def get(self, filename):
+        if filename in self.files:
+            self.files.move_to_end(filename)
+            return self.files[filename]
+
+        while len(self.files) >= self.max_open:
+            _, h5f = self.files.popitem(last=False)
+            h5f.close()
+            self.evictions += 1
+
+        # note: a file modified after being opened is not refreshed
+        h5f = self.files[filename] = h5py.File(filename, 'r')
+        self.opens += 1
+        return h5f
+
+    def close(self):
+        while self.files:
+            self.files.popitem()[1].close()
+
+
+def init_worker(max_open):
+    _local.pool = FilePool(max_open)
+
+
+def read(filename, dataset_name, selection):
+    # runs in a worker, which owns the open handles of its files
+    pool = _local.pool
+    data = pool.get(filename)[dataset_name][selection]
+    return data, pool.opens, pool.evictions
+
+
+def close_worker():
+    _local.pool.close()
+
+
+def freeze(selection):
+    # hashable form of a selection of ints and slices
+    if not isinstance(selection, tuple):
+        selection = (selection,)
+    return tuple((s.start, s.stop, s.step) if isinstance(s, slice) else s
+                 for s in selection)
+
+
+class AsyncReader:
+    # asyncio front-end reading slices of many files on a bounded executor
+    # note: each file is always read by the same single-threaded worker, so
+    # a handle is never shared; processes read in parallel, threads serialize
+    # on the hdf5 lock but still keep the event loop free
+    def __init__(self, workers=4, max_open=64, backend='process'):
+        executor = ProcessPoolExecutor if backend == 'process' else ThreadPoolExecutor
+        per_worker = max(max_open // workers, 1)
+        self.executors = [executor(max_workers=1, initializer=init_worker,
+                                   initargs=(per_worker,)) for _ in range(workers)]
+
+        # reads in flight, shared by duplicate requests
+        self.pending = {}
+        self.reads = 0
+        self.coalesced = 0
+        self.worker_stats = [(0, 0)] * workers
+
+    def worker(self, filename):
+        # stable assignment of files to workers
+        return zlib.crc32(filename.encode('utf-8')) % len(self.executors)
+
+    async def read(self, filename, dataset_name='data', selection=()):
+        key = (filename, dataset_name, freeze(selection))
+        if key in self.pending:
+            self.coalesced += 1
+        else:
+            self.reads += 1
+            self.pending[key] = asyncio.ensure_future(
+                self.submit(key, filename, dataset_name, selection))
+
+        # note: shield keeps a cancelled request from cancelling the others
+        return await asyncio.shield(self.pending[key])
+
+    async def submit(self, key, filename, dataset_name, selection):
+        index = self.worker(filename)
+        loop = asyncio.get_running_loop()
+        try:
+            data, opens, evictions = await loop.run_in_executor(
+                self.executors[index], read, filename, dataset_name, selection)
+        finally:
+            del self.pending[key]
+
+        self.worker_stats[index] = (opens, evictions)
+        return data
+
+    @property
+    def opens(self):
+        return sum(opens for opens, _ in self.worker_stats)
+
+    @property
+    def evictions(self):
+        return sum(evictions for _, evictions in self.worker_stats)
+
+    def close(self):
+        for executor in self.executors:
+            executor.submit(close_worker).result()
+            executor.shutdown()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
@@ -0,0 +1,128 @@
+import numpy as np
+
+
+class BufferedAppender:
+    # appends rows to a dataset resizable along its first axis
+    # note: rows are staged in a preallocated numpy buffer and written in
+    # whole-buffer slices, while the dataset grows geometrically so the number
+    # of resize calls is logarithmic in the final length
+    def __init__(self, dataset, buffer_rows=None, growth='double'):
+        if dataset.maxshape[0] is not None and dataset.maxshape[0] <= dataset.shape[0]:
+            raise ValueError(
+                f'dataset {dataset.name} is not resizable along axis 0')
+        if growth not in ('double', 'chunk'):
+            raise ValueError(f'unknown growth policy: {growth}')
+
+        self.dataset = dataset
+        self.growth = growth
+
+        # rows per chunk, used to align buffer flushes and growth
+        self.chunk_rows = dataset.chunks[0] if dataset.chunks is not None else 1
+
+        # default buffer holds a few whole chunks
+        if buffer_rows is None:
+            buffer_rows = max(self.chunk_rows * 4, 1024)
+        # round buffer up to a whole number of chunks
+        buffer_rows = -(-buffer_rows // self.chunk_rows) * self.chunk_rows
+
+        # preallocated staging buffer
+        self.buffer = np.empty((buffer_rows,) + dataset.shape[1:],
+                               dtype=dataset.dtype)
+        self.buffered = 0
+
+        # logical length of the dataset, excluding over-allocated rows
+        self.length = dataset.shape[0]
+        self.capacity = dataset.shape[0]
+
+        # counters
+        self.resizes = 0
+        self.writes = 0
+
+    def __len__(self):
+        return self.length + self.buffered
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, rows):
+        rows = np.asarray(rows)
+
+        # a single row is appended as a batch of one
+        if rows.shape == self.buffer.shape[1:]:
+            rows = rows[np.newaxis]
+
+        if rows.shape[1:] != self.buffer.shape[1:]:
+            raise ValueError(
+                f'cannot append rows of shape {rows.shape[1:]} to dataset '
+                f'{self.dataset.name} of shape {self.dataset.shape[1:]}')
+
+        buffer_rows = len(self.buffer)
+        offset = 0
+
+        while offset < len(rows):
+            # large batches bypass the buffer when it is empty
+            if self.buffered == 0 and len(rows) - offset >= buffer_rows:
+                count = (len(rows) - offset) // buffer_rows * buffer_rows
+                self._write(rows[offset:offset + count])
+                offset += count
+                continue
+
+            # copy as many rows as fit into the staging buffer
+            count = min(buffer_rows - self.buffered, len(rows) - offset)
+            self.buffer[self.buffered:self.buffered + count] = \
+                rows[offset:offset + count]
+            self.buffered += count
+            offset += count
+
+            # buffer full, write it
+            if self.buffered == buffer_rows:
+                self.flush()
+
+    def flush(self):
+        if self.buffered > 0:
+            self._write(self.buffer[:self.buffered])
+            self.buffered = 0
+
+    def close(self):
+        # write remaining rows and trim over-allocated rows
+        self.flush()
+        if self.capacity != self.length:
+            self.dataset.resize(self.length, axis=0)
+            self.capacity = self.length
+            self.resizes += 1
+
+    def _reserve(self, length):
+        if length <= self.capacity:
+            return
+
+        if self.growth == 'double':
+            # amortized doubling
+            new_capacity = max(length, 2 * self.capacity)
+        else:
+            # grow by at least one buffer
+            new_capacity = max(length, self.capacity + len(self.buffer))
+
+        # align to whole chunks
+        new_capacity = -(-new_capacity // self.chunk_rows) * self.chunk_rows
+
+        # never exceed the declared maximum shape
+        if self.dataset.maxshape[0] is not None:
+            if length > self.dataset.maxshape[0]:
+                raise ValueError(
+                    f'dataset {self.dataset.name} cannot grow beyond '
+                    f'{self.dataset.maxshape[0]} rows')
+            new_capacity = min(new_capacity, self.dataset.maxshape[0])
+
+        self.dataset.resize(new_capacity, axis=0)
+        self.capacity = new_capacity
+        self.resizes += 1
+
+    def _write(self, rows):
+        end = self.length + len(rows)
+        self._reserve(end)
+        self.dataset[self.length:end, ...] = rows
+        self.length = end
+        self.writes += 1
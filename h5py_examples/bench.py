@@ -0,0 +1,129 @@
+import os
+import sys
+import json
+import glob
+import time
+import atexit
+import tempfile
+import subprocess
+from contextlib import contextmanager
+
+
+# seconds spent in the timed core path of the current example, by name
+timings = {}
+
+
+@contextmanager
+def timed(name='core'):
+    # adds the time of the block to timings[name]
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.) + time.perf_counter() - start
+
+
+def add_arguments(parser):
+    # the --timing-json flag shared by the examples the runner benchmarks
+    parser.add_argument('-tj', '--timing-json', type=str,
+                        help='json file the time of the core path is written to at exit')
+
+
+def from_args(args):
+    if args.timing_json is not None:
+        atexit.register(write_timings, args.timing_json, os.getpid())
+
+
+def write_timings(filename, pid):
+    # note: forked processes inherit the handler, only the example writes
+    if os.getpid() == pid:
+        with open(filename, 'w') as f:
+            json.dump(timings, f)
+
+
+def run_case(script, argv, items, repeat=1):
+    # runs an example script in a fresh directory and process
+    # note: throughput and core_time come from the core path the example
+    # times itself, without interpreter start-up, imports or data
+    # generation; process_time and peak_rss cover the whole process; the
+    # run with the fastest core path is kept
+    result = None
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as directory:
+            timing_json = os.path.join(directory, 'timing.json')
+
+            # note: stderr goes to a file, a pipe could fill up and block
+            with tempfile.TemporaryFile() as stderr:
+                start = time.perf_counter()
+                process = subprocess.Popen([sys.executable, script] + argv +
+                                           ['--timing-json', timing_json], cwd=directory,
+                                           stdout=subprocess.DEVNULL, stderr=stderr)
+                # note: wait4 reports the resources of this child and its children
+                _, status, usage = os.wait4(process.pid, 0)
+                process_time = time.perf_counter() - start
+                process.returncode = os.waitstatus_to_exitcode(status)
+
+                if process.returncode != 0:
+                    stderr.seek(0)
+                    message = stderr.read().decode('utf-8', 'replace')
+                    raise RuntimeError(f'{script} {" ".join(argv)} failed:\n{message}')
+
+            with open(timing_json) as f:
+                core_time = json.load(f).get('core')
+            if core_time is None:
+                raise RuntimeError(f'{script} {" ".join(argv)} timed no core path')
+
+            file_size = sum(os.path.getsize(filename) for filename in
+                            glob.glob(os.path.join(directory, '**', '*.h5'), recursive=True))
+
+        # note: ru_maxrss is in kilobytes on linux
+        run = {'core_time': core_time, 'throughput': items / core_time,
+               'process_time': process_time, 'peak_rss': usage.ru_maxrss * 1024,
+               'file_size': file_size}
+        if result is None or run['core_time'] < result['core_time']:
+            result = run
+
+    return result
+
+
+def import_times(argv):
+    # (module, depth, self us, cumulative us) of python -X importtime argv
+    # note: depth 0 are imports of argv itself or of the interpreter start-up
+    process = subprocess.run([sys.executable, '-X', 'importtime'] + argv,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+    imports = []
+    for line in process.stderr.decode('utf-8', 'replace').splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, module = line[len('import time:'):].split('|')
+        depth = (len(module) - len(module.lstrip()) - 1) // 2
+        imports.append((module.strip(), depth, int(own), int(cumulative)))
+    return imports
+
+
+def save(filename, results):
+    with open(filename, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+
+def compare(results, baseline, thresholds):
+    # (case, metric, baseline value, value, ratio) of every regression
+    # note: thresholds map metrics to the allowed relative increase
+    regressions = []
+    for case, result in results.items():
+        if case not in baseline:
+            continue
+        for metric, threshold in thresholds.items():
+            # note: baselines of older runs can lack a metric
+            if metric not in baseline[case]:
+                continue
+            before, after = baseline[case][metric], result[metric]
+            if before and after / before > 1 + threshold:
+                regressions.append((case, metric, before, after, after / before))
+    return regressions
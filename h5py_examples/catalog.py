@@ -0,0 +1,141 @@
+import os
+import json
+import h5py
+import fnmatch
+
+
+# columns stored for each object
+FIELDS = ('path', 'kind', 'shape', 'dtype', 'chunks', 'storage_size', 'elements')
+
+
+def describe(path, obj):
+    # one catalog row for a low level object id
+    # note: low level ids avoid building a high level h5py object per entry
+    if isinstance(obj, h5py.h5d.DatasetID):
+        space = obj.get_space()
+        shape = list(space.shape) \
+            if space.get_simple_extent_type() != h5py.h5s.NULL else None
+        plist = obj.get_create_plist()
+        chunks = list(plist.get_chunk()) \
+            if plist.get_layout() == h5py.h5d.CHUNKED else None
+        # note: virtual and external datasets report no storage of their own
+        return (path, 'dataset', shape, str(obj.dtype), chunks,
+                obj.get_storage_size(), None)
+    if isinstance(obj, h5py.h5g.GroupID):
+        return (path, 'group', None, None, None, None, obj.get_num_objs())
+    return (path, 'datatype', None, str(obj.dtype), None, None, None)
+
+
+def build_catalog(h5f):
+    # walks the links of the file once, starting at the root group
+    # note: links are walked rather than objects, so soft, external and extra
+    # hard links get entries, as the element counts of their groups include
+    # them; a group reached by a second hard link is not walked again
+    root = h5f.file.id
+    names = []
+    root.links.visit(names.append)
+
+    # note: objects are opened after the walk, a failing open inside the
+    # visit callback would stop it
+    rows = [describe('/', h5py.h5o.open(root, b'/'))]
+    for name in names:
+        path = '/' + name.decode('utf-8')
+        try:
+            # note: named datatypes and groups are opened the same way as datasets
+            rows.append(describe(path, h5py.h5o.open(root, name)))
+        except KeyError:
+            # note: soft or external links whose target does not exist
+            rows.append((path, 'link', None, None, None, None, None))
+
+    return Catalog({field: list(column) for field, column in zip(FIELDS, zip(*rows))})
+
+
+class Catalog:
+    # compact in-memory index of the objects in a file, stored by column
+    def __init__(self, columns):
+        self.columns = columns
+        self.index = {path: i for i, path in enumerate(columns['path'])}
+
+    def __len__(self):
+        return len(self.columns['path'])
+
+    def __contains__(self, path):
+        return path in self.index
+
+    def __getitem__(self, path):
+        i = self.index[path]
+        return {field: self.columns[field][i] for field in FIELDS}
+
+    def query(self, pattern, kind=None):
+        # glob-style path query, e.g. '/group1/*' or '*/dataset?'
+        paths = fnmatch.filter(self.columns['path'], pattern)
+        if kind is not None:
+            paths = [path for path in paths
+                     if self.columns['kind'][self.index[path]] == kind]
+        return paths
+
+    def walk(self, root='/'):
+        # (path, depth) in depth-first order, parents before children
+        prefix = root.rstrip('/') + '/'
+        paths = [path for path in self.columns['path']
+                 if path == root or path.startswith(prefix)]
+        base = 0 if root == '/' else root.count('/')
+        for path in sorted(paths, key=lambda path: path.split('/')):
+            yield path, 0 if path == root else path.count('/') - base
+
+    def save(self, filename, stat):
+        with open(filename, 'w') as f:
+            json.dump({'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+                       'columns': self.columns}, f)
+
+
+def catalog_filename(filename):
+    # sidecar file next to the hdf5 file
+    return f'{filename}.catalog.json'
+
+
+def load_catalog(filename, cache=True):
+    # loads the sidecar catalog, rebuilding it when the file has changed
+    stat = os.stat(filename)
+    sidecar = catalog_filename(filename)
+
+    if cache and os.path.exists(sidecar):
+        with open(sidecar) as f:
+            cached = json.load(f)
+
+        # note: the cache is valid while the file mtime and size are unchanged
+        if cached['mtime_ns'] == stat.st_mtime_ns and cached['size'] == stat.st_size:
+            return Catalog(cached['columns'])
+
+    with h5py.File(filename, 'r') as h5f:
+        catalog = build_catalog(h5f)
+
+    if cache:
+        try:
+            catalog.save(sidecar, stat)
+        except OSError:
+            # note: a read-only location only disables the cache
+            pass
+
+    return catalog
+
+
+def print_h5f_content(h5f, catalog=None):
+    # prints the tree under h5f from the catalog, without opening each object
+    if catalog is None:
+        catalog = load_catalog(h5f.file.filename) if h5f.file.mode == 'r' \
+            else build_catalog(h5f)
+
+    for path, depth in catalog.walk(h5f.name):
+        entry = catalog[path]
+        if entry['kind'] == 'dataset':
+            # print name, shape and dtype
+            shape = tuple(entry['shape']) if entry['shape'] is not None else None
+            print('  ' * depth, f'{path}: shape {shape}, dtype {entry["dtype"]}')
+        elif entry['kind'] == 'group':
+            # print name, # of elements
+            print('  ' * depth, f'{path}: {entry["elements"]} elements')
+        elif entry['kind'] == 'link':
+            print('  ' * depth, f'{path}: unresolved link')
+        else:
+            print('  ' * depth, f'{path}: datatype {entry["dtype"]}')
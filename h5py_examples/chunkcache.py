@@ -0,0 +1,232 @@
+import h5py
+import numpy as np
+from collections import OrderedDict
+from multiprocessing import Lock, shared_memory
+
+
+CACHE_POLICIES = ('lru', 'arc')
+
+
+class LRUCache:
+    # least recently used decoded blocks, within a byte budget
+    def __init__(self, budget):
+        self.budget = budget
+        self.size = 0
+        self.blocks = OrderedDict()
+
+    def get(self, key):
+        block = self.blocks.get(key)
+        if block is not None:
+            self.blocks.move_to_end(key)
+        return block
+
+    def put(self, key, block):
+        self.blocks[key] = block
+        self.size += block.nbytes
+        while self.size > self.budget and len(self.blocks) > 1:
+            _, evicted = self.blocks.popitem(last=False)
+            self.size -= evicted.nbytes
+
+
+class ARCCache:
+    # adaptive replacement cache, balancing recency and frequency
+    # note: capacity is counted in blocks, the budget divided by the size of
+    # the first block; t1 and t2 hold blocks seen once and more than once,
+    # b1 and b2 remember the keys recently evicted from each
+    def __init__(self, budget):
+        self.budget = budget
+        self.capacity = None
+        self.p = 0
+        self.t1, self.t2 = OrderedDict(), OrderedDict()
+        self.b1, self.b2 = OrderedDict(), OrderedDict()
+
+    def get(self, key):
+        if key in self.t1:
+            # seen twice, promote to the frequent list
+            block = self.t2[key] = self.t1.pop(key)
+            return block
+        if key in self.t2:
+            self.t2.move_to_end(key)
+            return self.t2[key]
+        return None
+
+    def replace(self, key):
+        if self.t1 and (len(self.t1) > self.p or (key in self.b2 and len(self.t1) == self.p)):
+            evicted, _ = self.t1.popitem(last=False)
+            self.b1[evicted] = None
+        elif self.t2:
+            evicted, _ = self.t2.popitem(last=False)
+            self.b2[evicted] = None
+
+    def put(self, key, block):
+        if self.capacity is None:
+            self.capacity = max(self.budget // max(block.nbytes, 1), 1)
+        c = self.capacity
+
+        if key in self.b1:
+            # recently evicted once-seen key, favour recency
+            self.p = min(c, self.p + max(len(self.b2) // len(self.b1), 1))
+            self.replace(key)
+            del self.b1[key]
+            self.t2[key] = block
+        elif key in self.b2:
+            # recently evicted frequent key, favour frequency
+            self.p = max(0, self.p - max(len(self.b1) // len(self.b2), 1))
+            self.replace(key)
+            del self.b2[key]
+            self.t2[key] = block
+        else:
+            if len(self.t1) + len(self.b1) == c:
+                if len(self.t1) < c:
+                    self.b1.popitem(last=False)
+                    self.replace(key)
+                else:
+                    self.t1.popitem(last=False)
+            else:
+                total = len(self.t1) + len(self.t2) + len(self.b1) + len(self.b2)
+                if total >= c:
+                    if total == 2 * c:
+                        self.b2.popitem(last=False)
+                    self.replace(key)
+            self.t1[key] = block
+
+
+class SharedBlockCache:
+    # direct-mapped cache of decoded blocks in shared memory
+    # note: each block goes to slot key % slots; writers take a lock, readers
+    # do not, a per-slot sequence number (odd while writing) detects torn reads
+    def __init__(self, slots, block_shape, dtype, name=None, lock=None):
+        self.slots = slots
+        self.block_shape = tuple(block_shape)
+        self.dtype = np.dtype(dtype)
+        self.lock = lock if lock is not None else Lock()
+
+        header = 2 * slots * 8
+        data = slots * int(np.prod(self.block_shape, dtype=np.int64)) * self.dtype.itemsize
+        self.owner = name is None
+        self.memory = shared_memory.SharedMemory(name=name, create=self.owner,
+                                                 size=header + data)
+
+        # per slot: sequence number and key of the block held, -1 if none
+        self.header = np.ndarray((2, slots), dtype=np.int64, buffer=self.memory.buf)
+        self.data = np.ndarray((slots,) + self.block_shape, dtype=self.dtype,
+                               buffer=self.memory.buf, offset=header)
+        if self.owner:
+            self.header[0] = 0
+            self.header[1] = -1
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def __reduce__(self):
+        # other processes attach to the same memory
+        return (SharedBlockCache, (self.slots, self.block_shape, self.dtype.str,
+                                   self.name, self.lock))
+
+    def get(self, key):
+        slot = key % self.slots
+        sequence = self.header[0, slot]
+        if sequence % 2 or self.header[1, slot] != key:
+            return None
+
+        block = self.data[slot].copy()
+        if self.header[0, slot] != sequence:
+            return None
+        return block
+
+    def put(self, key, block):
+        slot = key % self.slots
+        # note: partial blocks at the end of the dataset are not shared
+        if block.shape != self.block_shape:
+            return
+        with self.lock:
+            self.header[0, slot] += 1
+            self.header[1, slot] = key
+            self.data[slot] = block
+            self.header[0, slot] += 1
+
+    def close(self):
+        del self.header, self.data
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+def rdcc_kwargs(dataset, nbytes):
+    # chunk cache arguments of h5py.File holding nbytes of chunks of dataset
+    # note: hdf5 suggests about 100 times more hash slots than cached chunks,
+    # and a prime number to spread the chunks across them
+    # note: w0 stays below 1, with w0=1 chunks read only in part are never
+    # evicted and the cache grows past rdcc_nbytes under random row reads
+    chunk_bytes = int(np.prod(dataset.chunks)) * dataset.dtype.itemsize
+    slots = max(nbytes // chunk_bytes, 1) * 100
+    while any(slots % d == 0 for d in range(2, int(slots ** 0.5) + 1)):
+        slots += 1
+    return {'rdcc_nbytes': nbytes, 'rdcc_nslots': slots, 'rdcc_w0': 0.75}
+
+
+class CachedDataset:
+    # row access to a chunked dataset through a cache of decoded blocks
+    # note: a block holds the rows of one chunk across all columns, so a row
+    # read decompresses its chunks once while the block stays cached
+    def __init__(self, dataset, budget=64 * 1024 * 1024, policy='lru', cache=None):
+        if dataset.chunks is None:
+            raise ValueError(f'dataset {dataset.name} is not chunked')
+
+        self.dataset = dataset
+        self.block_rows = dataset.chunks[0]
+        self.block_shape = (self.block_rows,) + dataset.shape[1:]
+
+        if cache is None:
+            if policy not in CACHE_POLICIES:
+                raise ValueError(f'unknown cache policy: {policy}')
+            cache = LRUCache(budget) if policy == 'lru' else ARCCache(budget)
+        self.cache = cache
+
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        return self.hits / max(self.hits + self.misses, 1)
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def block(self, index):
+        block = self.cache.get(index)
+        if block is None:
+            self.misses += 1
+            start = index * self.block_rows
+            block = self.dataset[start:start + self.block_rows]
+            self.cache.put(index, block)
+        else:
+            self.hits += 1
+        return block
+
+    def __getitem__(self, row):
+        # a single row, or a slice of rows
+        if isinstance(row, slice):
+            start, stop, step = row.indices(len(self.dataset))
+            return np.stack([self[i] for i in range(start, stop, step)]) \
+                if start < stop else self.dataset[row]
+
+        row = int(row)
+        if row < 0:
+            row += len(self.dataset)
+        if not 0 <= row < len(self.dataset):
+            raise IndexError(f'row {row} out of range for {self.dataset.name}')
+        return self.block(row // self.block_rows)[row % self.block_rows]
+
+
+def open_cached(filename, dataset_name, budget=64 * 1024 * 1024, policy='lru', rdcc=None):
+    # opens a file, optionally with a tuned hdf5 chunk cache, and its cached dataset
+    # note: rdcc is the chunk cache size in bytes given to hdf5
+    if rdcc is not None:
+        with h5py.File(filename, 'r') as h5f:
+            kwargs = rdcc_kwargs(h5f[dataset_name], rdcc)
+        h5f = h5py.File(filename, 'r', **kwargs)
+    else:
+        h5f = h5py.File(filename, 'r')
+    return h5f, CachedDataset(h5f[dataset_name], budget=budget, policy=policy)
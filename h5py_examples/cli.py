@@ -0,0 +1,45 @@
+import sys
+import argparse
+import importlib
+
+# note: only the standard library is imported here, h5py, numpy and the
+# dependencies of an example are imported when its subcommand runs
+
+
+EXAMPLES = {
+    'simple': 'create, tune and reduce a simple dataset',
+    'appending': 'append batches to a resizable dataset',
+    'swmr': 'single writer, multiple readers',
+    'groups': 'nested groups and a cached catalog',
+    'metadata': 'attributes and an attribute index',
+    'ragged': 'variable length arrays',
+    'string': 'variable length, fixed width and dictionary strings',
+    'dimensions': 'dimension scales and labeled selection',
+    'virtual_dataset': 'shards stitched into a virtual dataset',
+    'convert_dataset': 'convert a dataset into columns',
+}
+
+
+def load_example(name):
+    # imports the main module of an example by its package name
+    # note: examples are subpackages of h5py_examples.examples, so worker
+    # processes started by spawn or forkserver can import their functions
+    return importlib.import_module(f'h5py_examples.examples.{name}.main')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='h5py-examples')
+    subparsers = parser.add_subparsers(dest='example', metavar='example', required=True)
+    for name, description in EXAMPLES.items():
+        # note: arguments are parsed by the example itself
+        subparsers.add_parser(name, help=description, add_help=False)
+
+    args, rest = parser.parse_known_args(argv)
+
+    # run the example as if it was called as a script
+    sys.argv = [f'{parser.prog} {args.example}'] + rest
+    load_example(args.example).main()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+import os
+
+# the example directories as subpackages, e.g. h5py_examples.examples.simple.main
+# note: installed, they are copied here, see pyproject.toml; in the source
+# tree they are the directories next to the h5py_examples package
+_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if os.path.isfile(os.path.join(_root, 'pyproject.toml')):
+    __path__.append(_root)
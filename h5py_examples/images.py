@@ -0,0 +1,114 @@
+import os
+import cv2
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from h5py_examples.ragged import PackedRagged
+
+
+def encode_image(image, ext='.png', params=()):
+    # encoded bytes of an image array, e.g. to store generated images
+    ok, buffer = cv2.imencode(ext, image, list(params))
+    if not ok:
+        raise ValueError(f'could not encode image as {ext}')
+    return buffer.tobytes()
+
+
+class EncodedImage:
+    # extractors of an encoded image column and its shape and dtype columns
+    # note: read(key) returns the encoded bytes, e.g. the content of a jpeg or
+    # png file, which are stored as they are; the image is decoded once per
+    # key for its shape and dtype, shared by the side column extractors
+    # note: the last decoded key is kept per thread, as thread workers
+    # extract the columns of different keys at the same time
+    def __init__(self, read, flags=cv2.IMREAD_UNCHANGED):
+        self.read = read
+        self.flags = flags
+        self.local = threading.local()
+
+    def decoded(self, key):
+        last = getattr(self.local, 'last', None)
+        if last is None or last[0] != key:
+            data = self.read(key)
+            image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), self.flags)
+            if image is None:
+                raise ValueError(f'could not decode image {key}')
+            last = self.local.last = (key, data, image.shape, image.dtype.str)
+        return last
+
+    def __getstate__(self):
+        # note: the per-thread cache is left out, e.g. for process workers
+        return {'read': self.read, 'flags': self.flags}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def data(self, key):
+        return self.decoded(key)[1]
+
+    def shape(self, key):
+        # note: grayscale images get a channel axis, so all shapes are 3d
+        shape = self.decoded(key)[2]
+        return np.array(shape + (1,) * (3 - len(shape)), dtype=np.int32)
+
+    def dtype(self, key):
+        # note: a 0-d array, plain bytes would be stored as a packed column
+        return np.array(self.decoded(key)[3], dtype='S8')
+
+    def columns(self, name):
+        # extractors for convert_dataset_to_h5f
+        return {name: self.data, f'{name}_shape': self.shape, f'{name}_dtype': self.dtype}
+
+
+def read_file(filename):
+    with open(filename, 'rb') as f:
+        return f.read()
+
+
+class ImageReader:
+    # decodes batches of an encoded image column into one array
+    # note: blobs are read by the calling thread, as h5py serializes reads,
+    # and decoded on a thread pool, as cv2 releases the gil while decoding
+    def __init__(self, h5f, name, workers=None, flags=cv2.IMREAD_UNCHANGED):
+        self.blobs = PackedRagged(h5f[name])
+
+        # side columns are small and kept in memory
+        self.shapes = h5f[f'{name}_shape'][...]
+        self.dtypes = h5f[f'{name}_dtype'][...]
+
+        self.flags = flags
+        self.executor = ThreadPoolExecutor(max_workers=workers or os.cpu_count())
+
+    def __len__(self):
+        return len(self.blobs)
+
+    def decode(self, blob, out):
+        image = cv2.imdecode(blob, self.flags)
+        out[...] = image.reshape(out.shape)
+
+    def read(self, indices, out=None):
+        # images at indices, as an array of shape (len(indices),) + image shape
+        # note: all images of a batch must have the same shape and dtype
+        indices = np.asarray(indices, dtype=np.int64)
+        shapes = np.unique(self.shapes[indices], axis=0)
+        dtypes = np.unique(self.dtypes[indices])
+        if len(shapes) != 1 or len(dtypes) != 1:
+            raise ValueError('images of a batch have different shapes or dtypes')
+
+        if out is None:
+            out = np.empty((len(indices),) + tuple(shapes[0]),
+                           dtype=np.dtype(dtypes[0].decode('ascii')))
+
+        blobs = self.blobs.take(indices)
+        list(self.executor.map(self.decode, blobs, out))
+        return out
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,249 @@
+import json
+import time
+import itertools
+import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from h5py_examples import tuning
+from h5py_examples.ragged import PackedColumn, create_packed
+
+
+class ColumnBlockWriter:
+    # writes rows of named columns into one dataset per column
+    # note: values are collected into per-column numpy blocks and each block
+    # is written with a single slice assignment through a cached dataset handle
+    def __init__(self, h5f, length=None, block_size=1024, tune=None,
+                 checkpoint_every=None, resume=False):
+        self.h5f = h5f
+        self.length = length
+        self.block_size = block_size
+        self.tune = tune
+        self.checkpoint_every = checkpoint_every
+
+        # cached dataset handles and staging blocks, created on first use
+        self.datasets = {}
+        self.blocks = {}
+
+        # index of the first row of the current block and rows in it
+        # note: when resuming, writing continues after the committed rows
+        progress = load_progress(h5f) if resume else {}
+        self.start = min(progress.values()) if progress else 0
+        self.filled = 0
+        self.checkpointed = self.start
+
+        # per-column counters
+        self.stats = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def column_stats(self, column_name):
+        if column_name not in self.stats:
+            self.stats[column_name] = {'rows': 0, 'bytes': 0,
+                                       'extract_time': 0., 'write_time': 0.}
+        return self.stats[column_name]
+
+    def append(self, row):
+        # row is a dict mapping column names to values
+        for column_name, column_value in row.items():
+            block = self.blocks.get(column_name)
+
+            # allocate block using the first value of the column
+            # note: bytes values, e.g. encoded images, go to a packed column
+            if block is None:
+                if isinstance(column_value, bytes):
+                    block = np.empty(self.block_size, dtype=object)
+                else:
+                    column_value = np.asarray(column_value)
+                    block = np.empty((self.block_size,) + column_value.shape,
+                                     dtype=column_value.dtype)
+                self.blocks[column_name] = block
+
+            block[self.filled] = column_value
+
+        self.filled += 1
+
+        # block full, write it
+        if self.filled == self.block_size:
+            self.flush()
+
+    def flush(self):
+        if self.filled == 0:
+            return
+
+        end = self.start + self.filled
+
+        for column_name, block in self.blocks.items():
+            dataset = self.datasets.get(column_name)
+
+            # if column does not exists inside h5f
+            if dataset is None:
+                dataset = self.create_column(column_name, block[:self.filled])
+                self.datasets[column_name] = dataset
+
+            # grow columns of unknown length
+            start = time.perf_counter()
+            if dataset.shape[0] < end:
+                dataset.resize(end, axis=0)
+
+            # write the whole block with one slice assignment
+            dataset[self.start:end] = block[:self.filled]
+            stats = self.column_stats(column_name)
+            stats['write_time'] += time.perf_counter() - start
+            stats['rows'] += self.filled
+            stats['bytes'] += sum(map(len, block[:self.filled])) \
+                if block.dtype == object else block[:self.filled].nbytes
+
+        self.start = end
+        self.filled = 0
+
+        # record progress at the configured interval
+        if self.checkpoint_every is not None and \
+                self.start - self.checkpointed >= self.checkpoint_every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        # data must reach the file before progress claims it is written
+        self.h5f.flush()
+        save_progress(self.h5f, {column_name: self.start
+                                 for column_name in self.datasets})
+        self.h5f.flush()
+        self.checkpointed = self.start
+
+    def close(self):
+        self.flush()
+
+        # trim columns longer than the rows actually written
+        for dataset in self.datasets.values():
+            if dataset.shape[0] > self.start:
+                dataset.resize(self.start, axis=0)
+
+        if self.checkpoint_every is not None:
+            self.checkpoint()
+
+    def create_column(self, column_name, sample):
+        # bytes are stored packed, as flat uint8 values and an offsets index
+        # note: encoded data does not compress, so no filters are tuned
+        if sample.dtype == object:
+            group = self.h5f[column_name] if column_name in self.h5f \
+                else create_packed(self.h5f, column_name, np.uint8, self.length or 0)
+            return PackedColumn(group)
+
+        # get column attibutes
+        dtype = sample.dtype
+        shape = sample.shape[1:]
+
+        # reuse a column created by an interrupted run
+        # note: checked before tuning, its configuration is already fixed
+        if column_name in self.h5f:
+            return self.h5f[column_name]
+
+        # optionally tune chunking and filters on the first block
+        config = tuning.tune(sample, access=self.tune, maxshape=(None,) + shape) \
+            if self.tune is not None else None
+
+        # create dataset column
+        # note: columns of unknown length start empty and grow per block
+        dataset = self.h5f.create_dataset(name=column_name,
+                                          shape=(self.length or 0,) + shape,
+                                          maxshape=(None,) + shape,
+                                          dtype=dtype,
+                                          **tuning.dataset_kwargs(config))
+
+        # record the tuned configuration
+        tuning.record_tuning(dataset, config)
+
+        return dataset
+
+
+def load_progress(h5f):
+    # number of committed rows per column, i.e. the last fully written index + 1
+    return json.loads(h5f.attrs['progress']) if 'progress' in h5f.attrs else {}
+
+
+def save_progress(h5f, progress):
+    h5f.attrs['progress'] = json.dumps(progress)
+
+
+def extract_rows(values, keyfn, extractors):
+    # runs keyfn and the extractors on a task of values
+    rows = []
+    for principal_value in values:
+        # get key from current principal value
+        key = keyfn(principal_value)
+
+        # iterate over extractors, timing each one
+        row, timings = {}, {}
+        for column_name, extractor in extractors.items():
+            start = time.perf_counter()
+            row[column_name] = extractor(key)
+            timings[column_name] = time.perf_counter() - start
+
+        rows.append((row, timings))
+    return rows
+
+
+def pipeline(values, keyfn, extractors, workers=0, backend='thread',
+             task_size=16, max_pending=None):
+    # yields (row, timings) in the order of values
+    # note: with workers the extraction runs on a pool while the caller,
+    # the single writer, consumes results in order; at most max_pending
+    # tasks are in flight, which caps memory use
+    if workers <= 0:
+        for task in batched(values, task_size):
+            yield from extract_rows(task, keyfn, extractors)
+        return
+
+    if backend == 'thread':
+        executor_class = ThreadPoolExecutor
+    elif backend == 'process':
+        # note: keyfn and extractors must be picklable (module level functions)
+        executor_class = ProcessPoolExecutor
+    else:
+        raise ValueError(f'unknown backend: {backend}')
+
+    if max_pending is None:
+        max_pending = 4 * workers
+
+    tasks = batched(values, task_size)
+    with executor_class(max_workers=workers) as executor:
+        # bounded queue of futures, consumed in submission order
+        pending = deque()
+        for task in itertools.islice(tasks, max_pending):
+            pending.append(executor.submit(extract_rows, task, keyfn, extractors))
+
+        while pending:
+            rows = pending.popleft().result()
+
+            # refill the queue before handing rows to the writer
+            for task in itertools.islice(tasks, 1):
+                pending.append(executor.submit(extract_rows, task, keyfn, extractors))
+
+            yield from rows
+
+
+def batched(values, size):
+    iterator = iter(values)
+    while True:
+        task = list(itertools.islice(iterator, size))
+        if not task:
+            return
+        yield task
+
+
+def print_throughput(stats):
+    print(f'{"column":>20} {"rows":>10} {"rows/s":>12} {"MB/s":>10} '
+          f'{"extract (s)":>12} {"write (s)":>10}')
+
+    for column_name, column_stats in stats.items():
+        elapsed = column_stats['extract_time'] + column_stats['write_time']
+        rows_s = column_stats['rows'] / elapsed if elapsed > 0 else float('inf')
+        mb_s = column_stats['bytes'] / elapsed / 1e6 if elapsed > 0 else float('inf')
+
+        print(f'{column_name:>20} {column_stats["rows"]:>10} {rows_s:>12,.0f} '
+              f'{mb_s:>10.1f} {column_stats["extract_time"]:>12.3f} '
+              f'{column_stats["write_time"]:>10.3f}')
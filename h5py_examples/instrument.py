@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import atexit
+import threading
+import functools
+import h5py
+import numpy as np
+from collections import defaultdict
+
+
+# (dataset path, operation) -> [calls, bytes, seconds]
+stats = defaultdict(lambda: [0, 0, 0.])
+
+# chrome trace events, only collected with a trace file
+events = []
+
+# state of the current process
+_state = {'enabled': False, 'trace': None, 'pid': None, 'origin': 0.}
+
+# patched methods and their originals
+_originals = {}
+
+
+def nbytes(value):
+    # size of an array-like value, 0 when unknown
+    if value is None:
+        return 0
+    size = getattr(value, 'nbytes', None)
+    if size is None:
+        try:
+            size = np.asarray(value).nbytes
+        except (TypeError, ValueError):
+            size = 0
+    return size
+
+
+def selection_size(shape, key):
+    # number of elements key selects from a dataset of shape
+    # note: indexes a zero-strided view, so slices allocate nothing
+    view = np.lib.stride_tricks.as_strided(np.zeros(1, dtype=np.uint8), shape=shape,
+                                           strides=(0,) * len(shape))
+    return np.size(view[key])
+
+
+def setitem_bytes(args, kwargs, result):
+    # bytes written to the dataset, in its own dtype
+    # note: the value can be of another dtype or broadcast, e.g. float64
+    # written to an f4 dataset; keys numpy cannot apply, e.g. field names,
+    # fall back to the size of the value
+    dataset, key = args[0], args[1]
+    value = args[2] if len(args) > 2 else kwargs.get('val')
+    if dataset.dtype.kind != 'O':
+        try:
+            return selection_size(dataset.shape, key) * dataset.dtype.itemsize
+        except (IndexError, TypeError, ValueError):
+            pass
+    return nbytes(value)
+
+
+def getitem_bytes(args, kwargs, result):
+    return nbytes(result)
+
+
+def create_bytes(args, kwargs, result):
+    # note: as for writes, data is counted in the dtype of the dataset
+    if kwargs.get('data') is None or result.dtype.kind == 'O':
+        return nbytes(kwargs.get('data'))
+    return result.size * result.dtype.itemsize
+
+
+def no_bytes(args, kwargs, result):
+    return 0
+
+
+# methods wrapped by enable(), with how their bytes are counted
+METHODS = ((h5py.Dataset, 'resize', no_bytes),
+           (h5py.Dataset, '__setitem__', setitem_bytes),
+           (h5py.Dataset, '__getitem__', getitem_bytes),
+           (h5py.Dataset, 'flush', no_bytes),
+           (h5py.Dataset, 'refresh', no_bytes),
+           (h5py.Group, 'create_dataset', create_bytes),
+           (h5py.File, 'flush', no_bytes))
+
+
+def record(path, operation, size, start, end):
+    entry = stats[(path, operation)]
+    entry[0] += 1
+    entry[1] += size
+    entry[2] += end - start
+
+    if _state['trace'] is not None:
+        events.append({'name': operation, 'cat': path, 'ph': 'X',
+                       'ts': (start - _state['origin']) * 1e6, 'dur': (end - start) * 1e6,
+                       'pid': os.getpid(), 'tid': threading.get_ident(),
+                       'args': {'path': path, 'bytes': size}})
+
+
+def wrap(cls, name, count_bytes):
+    original = getattr(cls, name)
+    _originals[(cls, name)] = original
+
+    @functools.wraps(original)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = original(*args, **kwargs)
+        end = time.perf_counter()
+
+        # note: created datasets are counted under their own path
+        obj = result if name == 'create_dataset' else args[0]
+        record(obj.name, name, count_bytes(args, kwargs, result), start, end)
+        return result
+
+    setattr(cls, name, wrapper)
+
+
+def enable(trace=None):
+    # counts and times h5py calls per dataset path until the process exits
+    # note: methods are only patched here, so a disabled profile costs nothing;
+    # forked processes inherit the patches and must call report() themselves
+    if _state['enabled']:
+        return
+
+    _state.update(enabled=True, trace=trace, pid=os.getpid(), origin=time.perf_counter())
+    for cls, name, count_bytes in METHODS:
+        wrap(cls, name, count_bytes)
+
+    atexit.register(report)
+
+
+def add_arguments(parser):
+    # the --profile flags shared by every example
+    parser.add_argument('-pr', '--profile', action='store_true',
+                        help='count and time h5py calls per dataset, printed at exit')
+    parser.add_argument('-pt', '--profile-trace', type=str,
+                        help='chrome trace json file written by --profile')
+
+
+def from_args(args):
+    # note: without --profile h5py is left untouched
+    if args.profile:
+        enable(args.profile_trace)
+
+
+def disable():
+    for (cls, name), original in _originals.items():
+        setattr(cls, name, original)
+    _originals.clear()
+    _state['enabled'] = False
+
+
+def report():
+    # prints the summary table and writes the trace of this process
+    if not _state['enabled'] or not stats:
+        return
+
+    pid = os.getpid()
+    print(f'h5py calls of process {pid}')
+    print(f'{"path":<32} {"operation":<15} {"calls":>8} {"MB":>10} {"time (s)":>9}')
+    for (path, operation), (calls, size, seconds) in \
+            sorted(stats.items(), key=lambda item: -item[1][2]):
+        print(f'{path:<32} {operation:<15} {calls:>8} {size / 2 ** 20:>10.2f} {seconds:>9.4f}')
+
+    trace = _state['trace']
+    if trace is not None:
+        # note: forked processes write next to the trace of the parent
+        if pid != _state['pid']:
+            root, ext = os.path.splitext(trace)
+            trace = f'{root}.{pid}{ext}'
+        with open(trace, 'w') as f:
+            json.dump({'traceEvents': events}, f)
+        print('trace written to', trace)
+
+    stats.clear()
+    events.clear()
@@ -0,0 +1,140 @@
+import numpy as np
+
+
+def as_slice(index):
+    # range of indices as an equivalent slice with a positive step
+    return slice(index.start, index.start + len(index) * index.step, index.step)
+
+
+def attach_scales(dataset, coords):
+    # attaches a coordinate array as dimension scale for each labeled dimension
+    # note: coords maps labels to arrays, each stored next to the dataset
+    h5f = dataset.file
+    for dim in dataset.dims:
+        if dim.label not in coords:
+            continue
+
+        scale_name = f'{dataset.name}_{dim.label}'
+        if scale_name in h5f:
+            del h5f[scale_name]
+
+        scale = h5f.create_dataset(name=scale_name, data=np.asarray(coords[dim.label]))
+        scale.make_scale(dim.label)
+        dim.attach_scale(scale)
+
+
+class LabeledArray:
+    # labeled, lazy view of a dataset with dimension scales
+    # note: sel() and isel() only narrow the view, data is read with a single
+    # hyperslab when read() is called
+    def __init__(self, dataset, selection=None, scales=None):
+        self.dataset = dataset
+
+        # per dimension: a range of indices, or an int for dropped dimensions
+        self.selection = selection if selection is not None \
+            else tuple(range(n) for n in dataset.shape)
+
+        # coordinate arrays, loaded on first use and shared between views
+        self.scales = scales if scales is not None else {}
+
+    @property
+    def labels(self):
+        return [dim.label or f'dim_{i}' for i, dim in enumerate(self.dataset.dims)]
+
+    @property
+    def dims(self):
+        # labels of the dimensions kept by the view
+        return [label for label, index in zip(self.labels, self.selection)
+                if isinstance(index, range)]
+
+    @property
+    def shape(self):
+        return tuple(len(index) for index in self.selection if isinstance(index, range))
+
+    def scale(self, axis):
+        # sorted coordinate array of a dimension, or None without scale
+        if axis not in self.scales:
+            dim = self.dataset.dims[axis]
+            values = dim[0][...] if len(dim) > 0 else None
+            if values is not None and np.any(np.diff(values) < 0):
+                raise ValueError(f'scale of dimension {self.labels[axis]} is not sorted')
+            self.scales[axis] = values
+        return self.scales[axis]
+
+    @property
+    def coords(self):
+        # coordinates of the dimensions kept by the view
+        return {label: self.coordinates(axis)
+                for axis, label in enumerate(self.labels)
+                if isinstance(self.selection[axis], range)}
+
+    def coordinates(self, axis):
+        index = self.selection[axis]
+        values = self.scale(axis)
+        if values is None:
+            return np.asarray(index)
+        if isinstance(index, int):
+            return values[index]
+        return values[as_slice(index)]
+
+    def axis(self, label):
+        labels = self.labels
+        if label not in labels:
+            raise KeyError(f'unknown dimension {label}, expected one of {labels}')
+        axis = labels.index(label)
+        if not isinstance(self.selection[axis], range):
+            raise KeyError(f'dimension {label} was already selected')
+        return axis
+
+    def isel(self, **indexers):
+        # positional selection, i.e. isel(height=slice(0, 32), depth=1)
+        selection = list(self.selection)
+        for label, indexer in indexers.items():
+            axis = self.axis(label)
+            selection[axis] = selection[axis][indexer]
+            if isinstance(selection[axis], range) and selection[axis].step < 0:
+                raise ValueError('hdf5 selections cannot have negative steps')
+        return LabeledArray(self.dataset, tuple(selection), self.scales)
+
+    def sel(self, **indexers):
+        # coordinate selection, i.e. sel(height=slice(0, 32), depth=1)
+        # note: coordinates are found by binary search on the sorted scales,
+        # slices include both ends; dimensions without scale are positional
+        positions = {}
+        for label, indexer in indexers.items():
+            axis = self.axis(label)
+            values = self.coordinates(axis) if self.scale(axis) is not None else None
+
+            if values is None:
+                positions[label] = indexer
+            elif isinstance(indexer, slice):
+                if indexer.step is not None:
+                    raise ValueError('coordinate slices do not support steps')
+                start = 0 if indexer.start is None \
+                    else np.searchsorted(values, indexer.start, side='left')
+                stop = len(values) if indexer.stop is None \
+                    else np.searchsorted(values, indexer.stop, side='right')
+                positions[label] = slice(int(start), int(stop))
+            else:
+                position = int(np.searchsorted(values, indexer, side='left'))
+                if position == len(values) or values[position] != indexer:
+                    raise KeyError(f'{indexer} not found in the scale of {label}')
+                positions[label] = position
+
+        return self.isel(**positions)
+
+    def hyperslab(self):
+        # the view as a tuple of slices and ints, for a single hdf5 read
+        return tuple(index if isinstance(index, int) else as_slice(index)
+                     for index in self.selection)
+
+    def read(self):
+        return self.dataset[self.hyperslab()]
+
+    def __array__(self, dtype=None, copy=None):
+        data = self.read()
+        return data if dtype is None else data.astype(dtype)
+
+    def __repr__(self):
+        dims = ', '.join(f'{label}: {n}' for label, n in zip(self.dims, self.shape))
+        return f'<LabeledArray {self.dataset.name} ({dims})>'
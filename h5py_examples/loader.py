@@ -0,0 +1,152 @@
+import math
+import h5py
+import itertools
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+
+# files opened by the current worker process, reused across windows
+_files = {}
+
+
+def block_rows(datasets, length, world_size=1):
+    # rows of a block, as many as the largest chunk of any column
+    # note: columns with smaller chunks read the chunks covering a block, a
+    # chunk across two blocks is read by both; aligning every column, e.g.
+    # to the lcm of their chunk rows, can make blocks as large as the file
+    rows = max((dataset.chunks[0] if dataset.chunks else 1 for dataset in datasets),
+               default=1)
+
+    # note: capped so every rank gets at least one block
+    return max(min(rows, math.ceil(length / world_size)), 1)
+
+
+def shuffled_blocks(length, rows, seed=0, epoch=0, rank=0, world_size=1, drop_last=False):
+    # (start, stop) of the blocks of a rank, in a per-epoch random order
+    # note: every rank draws the same permutation and takes every
+    # world_size-th block, so ranks never overlap
+    blocks = [(start, min(start + rows, length)) for start in range(0, length, rows)]
+    rng = np.random.default_rng((seed, epoch))
+
+    # note: a shorter last block goes last, to a rank with a block more than
+    # others, so rows per rank differ by at most one block
+    order = rng.permutation(length // rows)
+    if length % rows:
+        order = np.append(order, len(blocks) - 1)
+    if drop_last:
+        # ranks get the same number of blocks
+        order = order[:len(order) // world_size * world_size]
+
+    own = order[rank::world_size]
+    return [blocks[i] for i in own[rng.permutation(len(own))]]
+
+
+def read_blocks(h5f, columns, blocks, seed):
+    # reads whole blocks of each column and shuffles their rows together
+    data = {name: np.concatenate([h5f[name][start:stop] for start, stop in blocks])
+            for name in columns}
+    permutation = np.random.default_rng(seed).permutation(len(next(iter(data.values()))))
+    return {name: values[permutation] for name, values in data.items()}
+
+
+def read_window(filename, columns, blocks, seed):
+    # read_blocks in a worker process
+    if filename not in _files:
+        _files[filename] = h5py.File(filename, 'r')
+    return read_blocks(_files[filename], columns, blocks, seed)
+
+
+class ShuffledLoader:
+    # shuffled minibatches of the columns written by convert_dataset_to_h5f
+    # note: rows are shuffled at two levels, the order of chunk-aligned
+    # blocks and the rows inside a window of buffer_blocks blocks, so each
+    # chunk is read and decompressed once per epoch
+    def __init__(self, filename, columns=None, batch_size=256, buffer_blocks=8,
+                 seed=0, rank=0, world_size=1, workers=0, prefetch=2, drop_last=False):
+        self.filename = filename
+        self.batch_size = batch_size
+        self.buffer_blocks = buffer_blocks
+        self.seed = seed
+        self.rank = rank
+        self.world_size = world_size
+        self.workers = workers
+        self.prefetch = prefetch
+        self.drop_last = drop_last
+        self.epoch = 0
+
+        with h5py.File(filename, 'r') as h5f:
+            if columns is None:
+                columns = [name for name, obj in h5f.items()
+                           if isinstance(obj, h5py.Dataset) and obj.ndim > 0]
+            datasets = [h5f[name] for name in columns]
+
+            lengths = {len(dataset) for dataset in datasets}
+            if len(lengths) != 1:
+                raise ValueError(f'columns have different lengths: {sorted(lengths)}')
+
+            self.columns = columns
+            self.length = lengths.pop()
+            self.block_rows = block_rows(datasets, self.length, world_size)
+
+    def set_epoch(self, epoch):
+        # note: call before each epoch for a new order, as all ranks must agree
+        self.epoch = epoch
+
+    def blocks(self):
+        # (start, stop) of the blocks of this rank in the current epoch
+        return shuffled_blocks(self.length, self.block_rows, self.seed, self.epoch,
+                               self.rank, self.world_size, self.drop_last)
+
+    def windows(self):
+        # groups of blocks read together, each with its own shuffle seed
+        blocks = self.blocks()
+        for i in range(0, len(blocks), self.buffer_blocks):
+            yield blocks[i:i + self.buffer_blocks], (self.seed, self.epoch, self.rank, i)
+
+    def read(self):
+        # shuffled windows, read ahead by worker processes
+        if self.workers <= 0:
+            with h5py.File(self.filename, 'r') as h5f:
+                for blocks, seed in self.windows():
+                    yield read_blocks(h5f, self.columns, blocks, seed)
+            return
+
+        windows = self.windows()
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            # bounded queue of futures, consumed in submission order
+            pending = deque()
+            for blocks, seed in itertools.islice(windows, self.workers * self.prefetch):
+                pending.append(executor.submit(read_window, self.filename,
+                                               self.columns, blocks, seed))
+
+            while pending:
+                window = pending.popleft().result()
+
+                for blocks, seed in itertools.islice(windows, 1):
+                    pending.append(executor.submit(read_window, self.filename,
+                                                   self.columns, blocks, seed))
+
+                yield window
+
+    def __iter__(self):
+        # batches of batch_size rows, the rest of a window goes to the next
+        rest = None
+        for window in self.read():
+            if rest is not None:
+                window = {name: np.concatenate([rest[name], window[name]])
+                          for name in self.columns}
+
+            rows = len(window[self.columns[0]])
+            end = rows - rows % self.batch_size
+            for start in range(0, end, self.batch_size):
+                yield {name: window[name][start:start + self.batch_size]
+                       for name in self.columns}
+            rest = {name: window[name][end:] for name in self.columns}
+
+        if rest is not None and not self.drop_last and len(rest[self.columns[0]]):
+            yield rest
+
+    def __len__(self):
+        rows = sum(stop - start for start, stop in self.blocks())
+        return rows // self.batch_size if self.drop_last else math.ceil(rows / self.batch_size)
@@ -0,0 +1,40 @@
+import h5py
+import numpy as np
+
+
+def can_memmap(dataset):
+    # true when the raw data is one contiguous, unfiltered block in the file
+    if dataset.shape is None or dataset.size == 0:
+        return False
+    if dataset.chunks is not None or dataset.is_virtual:
+        return False
+    if dataset.dtype.hasobject or h5py.check_vlen_dtype(dataset.dtype) is not None:
+        return False
+
+    # external storage keeps the data in other files
+    if dataset.id.get_create_plist().get_external_count() > 0:
+        return False
+
+    # only files on disk accessed with the default driver map one to one
+    if dataset.file.driver != 'sec2':
+        return False
+
+    # no offset means the storage is not allocated yet
+    return dataset.id.get_offset() is not None
+
+
+def memmap(dataset):
+    # read-only memory map of a contiguous dataset, or None
+    # note: no data is copied, pages are read from the file on access
+    if not can_memmap(dataset):
+        return None
+
+    return np.memmap(dataset.file.filename, mode='r', dtype=dataset.dtype,
+                     offset=dataset.id.get_offset(), shape=dataset.shape)
+
+
+def as_array(dataset):
+    # memory map when possible, otherwise the dataset itself
+    # note: both are indexed the same way, so callers need not care which
+    mapped = memmap(dataset)
+    return mapped if mapped is not None else dataset
@@ -0,0 +1,98 @@
+import numpy as np
+
+
+# name of the attribute index dataset
+INDEX_NAME = '_attr_index'
+
+
+def set_attrs(h5f, attrs, index=True):
+    # sets attributes on many objects in one call
+    # note: attrs maps object paths to {key: value}; the index is rewritten
+    # once per call, attributes set directly on objects are not indexed
+    rows = []
+    for path, values in attrs.items():
+        obj = h5f[path]
+        for k, v in values.items():
+            obj.attrs[k] = v
+
+            # note: index entries use absolute object names
+            rows.append((k, str(v), obj.name))
+
+    if index:
+        update_index(h5f, rows)
+
+
+def get_attrs(h5f, paths, keys=None):
+    # gets attributes of many objects in one call, optionally only some keys
+    result = {}
+    for path in paths:
+        obj_attrs = h5f[path].attrs
+        if keys is None:
+            result[path] = dict(obj_attrs.items())
+        else:
+            result[path] = {k: obj_attrs[k] for k in keys if k in obj_attrs}
+    return result
+
+
+def encode(strings):
+    return np.char.encode(np.asarray(strings, dtype=str), 'utf-8')
+
+
+def read_index(h5f):
+    # (key, value, path) rows sorted by key and value
+    if INDEX_NAME not in h5f:
+        return np.empty(0, dtype=[('key', 'S1'), ('value', 'S1'), ('path', 'S1')])
+    return h5f[INDEX_NAME][...]
+
+
+def update_index(h5f, rows):
+    # rows are (key, value, path) entries to add or replace
+    if not rows:
+        return
+
+    keys, values, paths = (encode(column) for column in zip(*rows))
+    index = read_index(h5f)
+
+    # drop entries replaced by the new values
+    replaced = set(zip(keys.tolist(), paths.tolist()))
+    keep = [(k, p) not in replaced for k, p in zip(index['key'].tolist(),
+                                                   index['path'].tolist())]
+    index = index[np.array(keep, dtype=bool)]
+
+    # fields are as wide as the longest entry
+    fields = ('key', 'value', 'path')
+    widths = [max(index[field].dtype.itemsize, column.dtype.itemsize)
+              for field, column in zip(fields, (keys, values, paths))]
+    dtype = np.dtype([(field, f'S{width}') for field, width in zip(fields, widths)])
+
+    new = np.empty(len(rows), dtype=dtype)
+    new['key'], new['value'], new['path'] = keys, values, paths
+    index = np.concatenate([index.astype(dtype), new])
+
+    # sorted by key, value and path, so matching entries are contiguous
+    index.sort(order=['key', 'value', 'path'])
+
+    # the index is a compound dataset, rewritten as a whole
+    if INDEX_NAME in h5f:
+        del h5f[INDEX_NAME]
+    h5f.create_dataset(name=INDEX_NAME, data=index,
+                       compression='gzip' if len(index) > 1024 else None)
+
+
+def query(h5f, key, value):
+    # paths of objects whose attribute key equals value, without opening them
+    index = read_index(h5f)
+    key, value = str(key).encode('utf-8'), str(value).encode('utf-8')
+
+    # note: entries wider than a field cannot be in the index, comparing
+    # them truncated would match every entry they are a prefix of
+    if len(key) > index.dtype['key'].itemsize or len(value) > index.dtype['value'].itemsize:
+        return []
+
+    # binary search for the block of (key, value) entries
+    pairs = index[['key', 'value']]
+    target = np.array([(key, value)], dtype=pairs.dtype)
+    start = np.searchsorted(pairs, target[0], side='left')
+    end = np.searchsorted(pairs, target[0], side='right')
+
+    return [path.decode('utf-8') for path in index['path'][start:end]]
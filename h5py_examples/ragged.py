@@ -0,0 +1,131 @@
+import numpy as np
+
+
+def pack(arrays, dtype=None):
+    # concatenates ragged arrays into flat values and an offsets index
+    # note: row i is values[offsets[i]:offsets[i + 1]]
+    lengths = np.fromiter((len(array) for array in arrays), dtype=np.int64,
+                          count=len(arrays))
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    values = np.concatenate(arrays).astype(dtype, copy=False) if len(arrays) \
+        else np.empty(0, dtype=dtype)
+    return values, offsets
+
+
+def unpack(values, offsets):
+    # zero-copy views into the flat values, one per row
+    return np.split(values, offsets[1:-1])
+
+
+def write_packed(h5f, name, arrays, dtype=None, **kwargs):
+    # stores ragged arrays as a group with a flat values and an offsets dataset
+    # note: each dataset is written at once, and values can be compressed
+    values, offsets = pack(arrays, dtype)
+
+    group = h5f.create_group(name)
+    group.attrs['format'] = 'packed-ragged'
+    group.create_dataset(name='values', data=values, **kwargs)
+    group.create_dataset(name='offsets', data=offsets)
+
+    return group
+
+
+def create_packed(h5f, name, dtype, length=0, chunk_values=2 ** 20, **kwargs):
+    # empty packed ragged group of length rows, grown as rows are written
+    group = h5f.create_group(name)
+    group.attrs['format'] = 'packed-ragged'
+    group.create_dataset(name='values', shape=(0,), maxshape=(None,), dtype=dtype,
+                         chunks=(chunk_values,), **kwargs)
+    group.create_dataset(name='offsets', shape=(length + 1,), maxshape=(None,),
+                         dtype=np.int64, chunks=True)
+    return group
+
+
+class PackedColumn:
+    # writer for a packed ragged group, with the interface of a resizable
+    # dataset of rows, so it can be written a block of rows at a time
+    # note: rows must be written in order, each block starts where the
+    # values of the previous one end
+    def __init__(self, group):
+        self.name = group.name
+        self.values = group['values']
+        self.offsets = group['offsets']
+
+    @property
+    def shape(self):
+        return (self.offsets.shape[0] - 1,)
+
+    def resize(self, size, axis=0):
+        rows = self.shape[0]
+        self.offsets.resize(size + 1, axis=0)
+        if size > rows:
+            # rows not written yet are empty
+            self.offsets[rows + 1:] = self.offsets[rows]
+        else:
+            self.values.resize(self.offsets[size], axis=0)
+
+    def __setitem__(self, rows, arrays):
+        start, stop, _ = rows.indices(self.shape[0])
+        arrays = [np.frombuffer(array, dtype=np.uint8) if isinstance(array, bytes) else array
+                  for array in arrays]
+        values, offsets = pack(arrays, self.values.dtype)
+
+        base = int(self.offsets[start])
+        end = base + len(values)
+        if self.values.shape[0] < end:
+            self.values.resize(end, axis=0)
+        self.values[base:end] = values
+        self.offsets[start + 1:stop + 1] = base + offsets[1:]
+
+
+class PackedRagged:
+    # reader for ragged arrays stored by write_packed
+    def __init__(self, group):
+        if group.attrs.get('format') != 'packed-ragged':
+            raise ValueError(f'{group.name} is not a packed ragged group')
+
+        self.values = group['values']
+
+        # the offsets index is small and kept in memory
+        self.offsets = group['offsets'][...]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        # random access to row i is a single hyperslab read
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f'row {i} out of range for {len(self)} rows')
+
+        return self.values[self.offsets[i]:self.offsets[i + 1]]
+
+    def take(self, indices):
+        # rows at indices, runs of consecutive indices are read at once
+        indices = np.asarray(indices, dtype=np.int64)
+        order = np.argsort(indices, kind='stable')
+        rows = [None] * len(indices)
+
+        run_start = 0
+        for i in range(1, len(order) + 1):
+            if i < len(order) and indices[order[i]] == indices[order[i - 1]] + 1:
+                continue
+            first, last = indices[order[run_start]], indices[order[i - 1]]
+            base = self.offsets[first]
+            values = self.values[base:self.offsets[last + 1]]
+            for j in order[run_start:i]:
+                rows[j] = values[self.offsets[indices[j]] - base:
+                                 self.offsets[indices[j] + 1] - base]
+            run_start = i
+
+        return rows
+
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def read(self):
+        # reads all values into one flat buffer and returns views into it
+        return unpack(self.values[...], self.offsets)
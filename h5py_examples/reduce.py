@@ -0,0 +1,153 @@
+import os
+import h5py
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+
+# results of previous reductions, keyed by dataset identity and state
+_cache = {}
+
+
+def block_selections(dataset, block_bytes=64 * 1024 * 1024):
+    # chunk-aligned blocks covering the dataset
+    shape = dataset.shape
+    if len(shape) == 0:
+        return [()]
+
+    row_bytes = int(np.prod(shape[1:], dtype=np.int64)) * dataset.dtype.itemsize
+    step = dataset.chunks[0] if dataset.chunks else 1
+
+    # a slab of whole chunks is too large, use the chunks themselves
+    if dataset.chunks and row_bytes * step > block_bytes:
+        return list(dataset.iter_chunks())
+
+    # whole rows, in multiples of the chunk rows
+    rows = max(block_bytes // max(row_bytes, 1) // step, 1) * step
+    rest = tuple(slice(0, n) for n in shape[1:])
+    return [(slice(start, min(start + rows, shape[0])),) + rest
+            for start in range(0, shape[0], rows)]
+
+
+def block_stats(data, axis=None, bins=None, hist_range=None):
+    # count, mean, m2, min, max and histogram of a block along axis
+    data = np.asarray(data, dtype=np.float64)
+    if axis is None:
+        data, axis = data.reshape(-1), 0
+
+    count = data.shape[axis]
+    mean = data.mean(axis=axis)
+    m2 = ((data - np.expand_dims(mean, axis)) ** 2).sum(axis=axis)
+    stats = {'count': count, 'mean': mean, 'm2': m2,
+             'min': data.min(axis=axis), 'max': data.max(axis=axis)}
+
+    if bins is not None:
+        # one histogram per output position, computed with a single bincount
+        lo, hi = hist_range
+        values = np.moveaxis(data, axis, -1).reshape(-1, count)
+        inside = (values >= lo) & (values <= hi)
+        index = ((values - lo) / ((hi - lo) or 1) * bins).astype(np.int64)
+        index = np.clip(index, 0, bins - 1)
+        index += np.arange(len(values))[:, np.newaxis] * bins
+        hist = np.bincount(index[inside], minlength=len(values) * bins)
+        stats['hist'] = hist.reshape(mean.shape + (bins,))
+
+    return stats
+
+
+def merge(acc, stats):
+    # merges block statistics into acc, with chan's parallel update
+    if acc is None:
+        return {k: np.copy(v) for k, v in stats.items()}
+
+    n_a, n_b = acc['count'], stats['count']
+    n = n_a + n_b
+    delta = stats['mean'] - acc['mean']
+    acc['mean'] = acc['mean'] + delta * (n_b / n)
+    acc['m2'] = acc['m2'] + stats['m2'] + delta ** 2 * (n_a * n_b / n)
+    acc['count'] = n
+    acc['min'] = np.minimum(acc['min'], stats['min'])
+    acc['max'] = np.maximum(acc['max'], stats['max'])
+    if 'hist' in stats:
+        acc['hist'] = acc['hist'] + stats['hist']
+    return acc
+
+
+def reduce_blocks(filename, dataset_name, selections, axis, bins, hist_range):
+    # block statistics of a list of selections, run in a worker process
+    with h5py.File(filename, 'r') as h5f:
+        dataset = h5f[dataset_name]
+        return [block_stats(dataset[selection], axis, bins, hist_range)
+                for selection in selections]
+
+
+def region(selection, axis):
+    # where the statistics of a block go in the output
+    if axis is None:
+        return ()
+    return tuple(s for i, s in enumerate(selection) if i != axis)
+
+
+def reduce(dataset, axis=None, bins=None, hist_range=None, workers=0,
+           block_bytes=64 * 1024 * 1024, cache=False):
+    # streaming mean, var, min, max and histogram of a dataset along axis
+    # note: the dataset is read in chunk-aligned blocks, never as a whole;
+    # with workers the blocks are reduced by a process pool, which requires
+    # the file to be readable from other processes
+    if axis is not None:
+        axis = axis % dataset.ndim
+
+    # histograms need a range known before the first block is binned
+    if bins is not None and hist_range is None:
+        extent = reduce(dataset, workers=workers, block_bytes=block_bytes, cache=cache)
+        hist_range = (float(extent['min']), float(extent['max']))
+
+    filename = os.path.realpath(dataset.file.filename)
+    if cache:
+        stat = os.stat(filename)
+        cache_key = (filename, dataset.name, stat.st_mtime_ns, stat.st_size,
+                     axis, bins, hist_range)
+        if cache_key in _cache:
+            return {k: np.copy(v) for k, v in _cache[cache_key].items()}
+
+    selections = block_selections(dataset, block_bytes)
+
+    if workers > 0 and len(selections) > 1:
+        tasks = [selections[i::workers] for i in range(min(workers, len(selections)))]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(reduce_blocks, filename, dataset.name,
+                                       task, axis, bins, hist_range) for task in tasks]
+            partials = [(selection, stats) for task, future in zip(tasks, futures)
+                        for selection, stats in zip(task, future.result())]
+    else:
+        partials = ((selection, block_stats(dataset[selection], axis, bins, hist_range))
+                    for selection in selections)
+
+    # blocks covering the same output region are merged together
+    accumulators = {}
+    for selection, stats in partials:
+        key = tuple((s.start, s.stop) for s in region(selection, axis))
+        accumulators[key] = merge(accumulators.get(key), stats)
+
+    # assemble the regions into the output arrays
+    # note: regions without any block, e.g. of an empty dataset, stay nan as
+    # for numpy reductions over no elements
+    out_shape = () if axis is None else dataset.shape[:axis] + dataset.shape[axis + 1:]
+    result = {'mean': np.full(out_shape, np.nan), 'var': np.full(out_shape, np.nan),
+              'min': np.full(out_shape, np.nan), 'max': np.full(out_shape, np.nan)}
+    if bins is not None:
+        result['hist'] = np.zeros(out_shape + (bins,), dtype=np.int64)
+        result['bin_edges'] = np.linspace(*hist_range, bins + 1)
+
+    for key, acc in accumulators.items():
+        out = tuple(slice(start, stop) for start, stop in key)
+        result['mean'][out] = acc['mean']
+        result['var'][out] = acc['m2'] / acc['count']
+        result['min'][out] = acc['min']
+        result['max'][out] = acc['max']
+        if bins is not None:
+            result['hist'][out] = acc['hist']
+
+    if cache:
+        _cache[cache_key] = {k: np.copy(v) for k, v in result.items()}
+
+    return result
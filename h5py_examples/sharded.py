@@ -0,0 +1,149 @@
+import os
+import h5py
+from concurrent.futures import ProcessPoolExecutor
+
+from h5py_examples import tuning, vds
+from h5py_examples.appender import BufferedAppender
+from h5py_examples.reduce import block_selections
+
+
+# filters of the shards when no tuned configuration is given
+DEFAULT_FILTERS = {'compression': 'gzip', 'compression_opts': 4, 'shuffle': True}
+
+
+def shard_filenames(filename, shards):
+    # data.h5 -> data.shard_0.h5, data.shard_1.h5, ...
+    root, ext = os.path.splitext(filename)
+    return [f'{root}.shard_{index}{ext}' for index in range(shards)]
+
+
+def shard_ranges(length, shards, chunk_rows):
+    # contiguous (start, stop) rows of each shard
+    # note: shards start on chunk boundaries, so compaction can copy
+    # chunks as they are stored
+    chunks = -(-length // chunk_rows)
+    bounds = [min(chunks * i // shards * chunk_rows, length) for i in range(shards + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def write_shard(filename, dataset_name, produce, start, stop, batch_size, chunk_rows, kwargs):
+    # writes rows [start, stop) produced by produce(start, stop), in a worker
+    # note: data generation and compression run in this process, in parallel
+    # with the other shards
+    with h5py.File(filename, 'w') as h5f:
+        dataset = None
+        for batch_start in range(start, stop, batch_size):
+            batch = produce(batch_start, min(batch_start + batch_size, stop))
+
+            # create the dataset from the first batch
+            if dataset is None:
+                row_shape = batch.shape[1:]
+                dataset = h5f.create_dataset(name=dataset_name, shape=(0,) + row_shape,
+                                             maxshape=(None,) + row_shape, dtype=batch.dtype,
+                                             **{'chunks': (chunk_rows,) + row_shape, **kwargs})
+                appender = BufferedAppender(dataset)
+
+            appender.append(batch)
+
+        if dataset is not None:
+            appender.close()
+            return dataset.shape[0]
+    return 0
+
+
+def write_sharded(filename, dataset_name, produce, length, shards=None, batch_size=1024,
+                  chunk_rows=1024, config=None, compact=False):
+    # appends length rows across shard files written by worker processes,
+    # then stitches the shards into one virtual dataset in filename
+    # note: produce must be picklable, i.e. a module level function
+    shards = shards or os.cpu_count()
+    if config is not None:
+        kwargs = tuning.dataset_kwargs(config)
+        chunk_rows = kwargs.pop('chunks')[0]
+    else:
+        kwargs = dict(DEFAULT_FILTERS)
+
+    # note: shards without rows, e.g. more shards than chunks, are not written
+    shards = [(shard, start, stop) for shard, (start, stop) in
+              zip(shard_filenames(filename, shards), shard_ranges(length, shards, chunk_rows))
+              if start < stop]
+    with ProcessPoolExecutor(max_workers=max(len(shards), 1)) as executor:
+        futures = [executor.submit(write_shard, shard, dataset_name, produce,
+                                   start, stop, batch_size, chunk_rows, kwargs)
+                   for shard, start, stop in shards]
+        for future in futures:
+            future.result()
+
+    filenames = [shard for shard, _, _ in shards]
+
+    # note: without libver='latest' virtual dataset will not work
+    with h5py.File(filename, 'w', libver='latest') as h5f:
+        vds.create_virtual_dataset(h5f, dataset_name, filenames,
+                                   source_name=dataset_name, workers=0)
+
+    if compact:
+        compact_virtual_dataset(filename, dataset_name)
+
+    return filenames
+
+
+def copy_chunks(source, target, offset):
+    # copies the stored, still compressed chunks of source into target
+    for index in range(source.id.get_num_chunks()):
+        info = source.id.get_chunk_info(index)
+        filter_mask, chunk = source.id.read_direct_chunk(info.chunk_offset)
+        target_offset = (info.chunk_offset[0] + offset,) + info.chunk_offset[1:]
+        target.id.write_direct_chunk(target_offset, chunk, filter_mask)
+
+
+def compact_virtual_dataset(filename, dataset_name, remove=True):
+    # replaces the virtual dataset with one physical dataset holding the shards
+    # note: shards with the chunking and filters of the first one, starting on
+    # a chunk boundary, are copied without decompressing them
+    base = os.path.dirname(os.path.abspath(filename))
+    compacted = f'{filename}.compact'
+
+    with h5py.File(filename, 'r') as h5f:
+        virtual = h5f[dataset_name]
+        sources = [(os.path.join(base, name) if name != '.' else filename, dset_name, rows)
+                   for name, dset_name, _, rows in vds.mapped_sources(virtual)]
+
+        with h5py.File(sources[0][0], 'r') as first, h5py.File(compacted, 'w') as out:
+            template = first[sources[0][1]]
+            target = out.create_dataset(name=dataset_name, shape=virtual.shape,
+                                        maxshape=(None,) + virtual.shape[1:],
+                                        dtype=virtual.dtype, chunks=template.chunks or True,
+                                        compression=template.compression,
+                                        compression_opts=template.compression_opts,
+                                        shuffle=template.shuffle)
+
+            offset = 0
+            for shard, dset_name, (start, stop) in sources:
+                with h5py.File(shard, 'r') as source_file:
+                    source = source_file[dset_name]
+                    # note: chunks are only copied raw from shards mapped whole
+                    raw = source.chunks == target.chunks \
+                        and source.compression == target.compression \
+                        and source.compression_opts == target.compression_opts \
+                        and source.shuffle == target.shuffle \
+                        and offset % target.chunks[0] == 0 \
+                        and (start, stop) == (0, source.shape[0])
+                    if raw:
+                        copy_chunks(source, target, offset)
+                    else:
+                        for selection in block_selections(source):
+                            lo = max(selection[0].start, start)
+                            hi = min(selection[0].stop, stop)
+                            if lo >= hi:
+                                continue
+                            rows = slice(lo - start + offset, hi - start + offset)
+                            target[(rows,) + tuple(selection[1:])] = \
+                                source[(slice(lo, hi),) + tuple(selection[1:])]
+                offset += stop - start
+
+    os.replace(compacted, filename)
+
+    if remove:
+        for shard, _, _ in sources:
+            if os.path.exists(shard) and os.path.abspath(shard) != os.path.abspath(filename):
+                os.remove(shard)
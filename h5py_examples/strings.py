@@ -0,0 +1,84 @@
+import h5py
+import numpy as np
+
+
+def encode_fixed(strings):
+    # utf-8 encodes strings into a fixed width 'S' array
+    # note: numpy picks the width of the longest encoded string
+    return np.char.encode(np.asarray(strings, dtype=str), 'utf-8')
+
+
+def decode_fixed(data):
+    return np.char.decode(np.asarray(data), 'utf-8')
+
+
+def encode_dictionary(strings):
+    # table of unique strings plus the code of each string in the table
+    table, codes = np.unique(np.asarray(strings, dtype=str), return_inverse=True)
+
+    # smallest unsigned type able to hold the codes
+    codes = codes.astype(np.min_scalar_type(max(len(table) - 1, 0)))
+    return table, codes
+
+
+def decode_dictionary(table, codes):
+    return table[codes]
+
+
+def write_fixed(h5f, name, strings, **kwargs):
+    data = encode_fixed(strings)
+
+    # fixed width utf-8 strings, stored with a single write
+    # note: the view only tags the bytes as utf-8, nothing is copied
+    data = data.view(h5py.string_dtype('utf-8', data.dtype.itemsize))
+    dataset = h5f.create_dataset(name=name, data=data, **kwargs)
+    dataset.attrs['encoding'] = 'fixed'
+    return dataset
+
+
+def read_fixed(dataset):
+    return decode_fixed(dataset[...])
+
+
+def write_dictionary(h5f, name, strings, **kwargs):
+    # stores strings as a group with a table of unique strings and codes
+    # note: codes are small integers, they compress well and can be filtered
+    # without decoding any string
+    table, codes = encode_dictionary(strings)
+
+    group = h5f.create_group(name)
+    group.attrs['encoding'] = 'dictionary'
+    write_fixed(group, 'table', table)
+    group.create_dataset(name='codes', data=codes, **kwargs)
+    return group
+
+
+class DictionaryStrings:
+    # reader for strings stored by write_dictionary
+    def __init__(self, group):
+        if group.attrs.get('encoding') != 'dictionary':
+            raise ValueError(f'{group.name} is not a dictionary encoded group')
+
+        # the table of unique strings is small and kept in memory
+        self.table = read_fixed(group['table'])
+        self.codes = group['codes']
+
+    def __len__(self):
+        return len(self.codes)
+
+    def code(self, value):
+        # table is sorted, so a string is found by binary search
+        index = np.searchsorted(self.table, value)
+        if index < len(self.table) and self.table[index] == value:
+            return index
+        return None
+
+    def read(self):
+        return decode_dictionary(self.table, self.codes[...])
+
+    def where(self, value):
+        # indices of rows equal to value, compared on the codes only
+        code = self.code(value)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(self.codes[...] == code)
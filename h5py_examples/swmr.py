@@ -0,0 +1,176 @@
+import time
+import h5py
+import numpy as np
+
+
+def open_swmr(filename, timeout=10.0, interval=0.05):
+    # open a file for swmr reading, retrying until the writer enables swmr mode
+    # note: until then the file is missing or locked by the writer
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return h5py.File(filename, 'r', libver='latest', swmr=True)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(interval)
+
+
+class SwmrTail:
+    # yields rows appended to a dataset by a swmr writer, without any ipc
+    # note: the dataset is polled with refresh(); the poll interval shrinks
+    # while new rows keep arriving and grows geometrically while idle
+    def __init__(self, dataset, offset=0, min_interval=1e-3, max_interval=0.25,
+                 backoff=2.0, idle_timeout=1.0, max_rows=None):
+        self.dataset = dataset
+        self.offset = offset
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.max_rows = max_rows
+
+        # counters
+        self.rows = 0
+        self.blocks = 0
+        self.polls = 0
+        self.first_time = None
+        self.last_time = None
+
+    def __iter__(self):
+        interval = self.min_interval
+        idle_since = time.monotonic()
+
+        while True:
+            # refresh dataset and check its current length
+            self.dataset.refresh()
+            self.polls += 1
+            length = self.dataset.shape[0]
+
+            if length > self.offset:
+                # read the new rows, optionally in bounded blocks
+                end = length if self.max_rows is None \
+                    else min(length, self.offset + self.max_rows)
+                block = self.dataset[self.offset:end, ...]
+
+                now = time.monotonic()
+                if self.first_time is None:
+                    self.first_time = now
+                self.last_time = now
+                self.rows += len(block)
+                self.blocks += 1
+
+                # the offset only advances past rows handed to the consumer
+                start, self.offset = self.offset, end
+                yield start, block
+
+                # data is flowing, poll faster
+                interval = max(self.min_interval, interval / self.backoff)
+                idle_since = time.monotonic()
+                continue
+
+            # stop once the writer has been idle for too long
+            if self.idle_timeout is not None and \
+                    time.monotonic() - idle_since > self.idle_timeout:
+                return
+
+            # file is idle, back off
+            time.sleep(interval)
+            interval = min(self.max_interval, interval * self.backoff)
+
+    @property
+    def rows_per_second(self):
+        if self.first_time is None or self.last_time == self.first_time:
+            return float('nan')
+        return self.rows / (self.last_time - self.first_time)
+
+
+# flush policies understood by FlushPolicy
+FLUSH_POLICIES = ('batch', 'size', 'time', 'hybrid')
+
+
+class FlushPolicy:
+    # decides when coalesced rows are made visible to swmr readers
+    # note: 'batch' flushes every append, 'size' once enough rows are pending,
+    # 'time' once enough time passed since the last flush, 'hybrid' on either
+    def __init__(self, kind='batch', rows=None, interval=None):
+        if kind not in FLUSH_POLICIES:
+            raise ValueError(f'unknown flush policy: {kind}')
+        if kind in ('size', 'hybrid') and rows is None:
+            raise ValueError(f'flush policy {kind} needs a number of rows')
+        if kind in ('time', 'hybrid') and interval is None:
+            raise ValueError(f'flush policy {kind} needs an interval')
+
+        self.kind = kind
+        self.rows = rows
+        self.interval = interval
+
+    def due(self, pending_rows, elapsed):
+        if self.kind == 'batch':
+            return True
+
+        size_due = self.rows is not None and pending_rows >= self.rows
+        time_due = self.interval is not None and elapsed >= self.interval
+
+        if self.kind == 'size':
+            return size_due
+        if self.kind == 'time':
+            return time_due
+        return size_due or time_due
+
+
+class CoalescingWriter:
+    # appends rows to a swmr dataset, coalescing them under a flush policy
+    # note: each flush is one resize, one write and one dataset flush, so a
+    # whole coalesced extent becomes visible to readers at once
+    # note: policies are checked on append, a stalled producer delays flushes
+    def __init__(self, dataset, policy=None):
+        self.dataset = dataset
+        self.policy = policy if policy is not None else FlushPolicy()
+
+        # rows waiting for the next flush
+        self.pending = []
+        self.pending_rows = 0
+        self.last_flush = time.monotonic()
+
+        # counters
+        self.flushes = 0
+        self.flush_bytes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, rows):
+        self.pending.append(rows)
+        self.pending_rows += len(rows)
+
+        if self.policy.due(self.pending_rows, time.monotonic() - self.last_flush):
+            self.flush()
+
+    def flush(self):
+        if self.pending_rows > 0:
+            rows = self.pending[0] if len(self.pending) == 1 \
+                else np.concatenate(self.pending)
+
+            # resize dataset once for the whole extent
+            current_length = self.dataset.shape[0]
+            new_length = current_length + len(rows)
+            self.dataset.resize(new_length, axis=0)
+
+            # append the coalesced rows and make them visible
+            self.dataset[current_length:new_length, ...] = rows
+            self.dataset.flush()
+
+            self.flushes += 1
+            # note: bytes are counted in the dataset dtype
+            self.flush_bytes.append(rows.size * self.dataset.dtype.itemsize)
+
+        self.pending = []
+        self.pending_rows = 0
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
@@ -0,0 +1,171 @@
+import json
+import time
+import h5py
+import itertools
+import numpy as np
+
+
+# access patterns a dataset can be tuned for
+ACCESS_PATTERNS = ('rows', 'columns')
+
+# chunk sizes tried, in bytes
+CHUNK_BYTES = (16 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024)
+
+# filter pipelines tried: (compression, compression_opts, shuffle)
+FILTERS = (
+    (None, None, False),
+    ('lzf', None, False),
+    ('lzf', None, True),
+    ('gzip', 1, False),
+    ('gzip', 1, True),
+    ('gzip', 4, True),
+    ('gzip', 9, True),
+)
+
+
+def candidate_chunks(shape, dtype, maxshape=None):
+    itemsize = np.dtype(dtype).itemsize
+    row_shape = tuple(shape[1:])
+    row_items = int(np.prod(row_shape, dtype=np.int64)) if row_shape else 1
+
+    # fixed length axes cannot have chunks larger than the axis
+    max_rows = None if maxshape is not None and maxshape[0] is None \
+        else max(shape[0], 1)
+
+    candidates = []
+    for chunk_bytes in CHUNK_BYTES:
+        # chunks spanning whole rows, good for row scans
+        rows = max(chunk_bytes // (row_items * itemsize), 1)
+        candidates.append((rows,) + row_shape)
+
+        # chunks one element wide on the last axis, good for column scans
+        if len(row_shape) > 0:
+            narrow = row_shape[:-1] + (1,)
+            narrow_items = int(np.prod(narrow, dtype=np.int64))
+            rows = max(chunk_bytes // (narrow_items * itemsize), 1)
+            candidates.append((rows,) + narrow)
+
+    if max_rows is not None:
+        candidates = [(min(c[0], max_rows),) + c[1:] for c in candidates]
+
+    # remove duplicates keeping order
+    return list(dict.fromkeys(candidates))
+
+
+def read_pattern(dataset, access, block_rows=1024):
+    if access == 'rows':
+        # sequential scan in blocks of rows
+        for start in range(0, dataset.shape[0], block_rows):
+            dataset[start:start + block_rows, ...]
+    elif access == 'columns':
+        # whole column reads, e.g. dataset[:, 0]
+        columns = dataset.shape[-1] if dataset.ndim > 1 else 1
+        for column in range(min(columns, 4)):
+            dataset[..., column] if dataset.ndim > 1 else dataset[...]
+    else:
+        raise ValueError(f'unknown access pattern: {access}')
+
+
+def trial(sample, chunks, compression, compression_opts, shuffle, access, maxshape=None):
+    # note: the core driver without backing store keeps the trial in memory
+    with h5py.File('tuning.h5', 'w', driver='core', backing_store=False) as h5f:
+        dataset = h5f.create_dataset(name='trial',
+                                     shape=sample.shape,
+                                     maxshape=maxshape,
+                                     dtype=sample.dtype,
+                                     chunks=chunks,
+                                     compression=compression,
+                                     compression_opts=compression_opts,
+                                     shuffle=shuffle)
+
+        start = time.perf_counter()
+        dataset[...] = sample
+        h5f.flush()
+        write_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        read_pattern(dataset, access)
+        read_time = time.perf_counter() - start
+
+        storage_size = dataset.id.get_storage_size()
+
+    return {
+        'chunks': list(chunks),
+        'compression': compression,
+        'compression_opts': compression_opts,
+        'shuffle': shuffle,
+        'access': access,
+        'write_mb_s': sample.nbytes / write_time / 1e6,
+        'read_mb_s': sample.nbytes / read_time / 1e6,
+        'ratio': sample.nbytes / max(storage_size, 1),
+        'write_time': write_time,
+        'read_time': read_time,
+        'storage_size': storage_size,
+    }
+
+
+def tune(sample, dtype=None, access='rows', maxshape=None, sample_rows=16384,
+         sample_bytes=4 * 2 ** 20, weights=(1.0, 1.0, 1.0), verbose=False):
+    if access not in ACCESS_PATTERNS:
+        raise ValueError(f'unknown access pattern: {access}')
+
+    # trials run on the leading rows of the real data
+    # note: the sample is capped by bytes as well, so every trial stays
+    # short however large the rows are, e.g. images
+    row_shape = tuple(sample.shape[1:])
+    row_bytes = int(np.prod(row_shape, dtype=np.int64)) * \
+        np.dtype(dtype or sample.dtype).itemsize
+    sample_rows = min(sample_rows, max(sample_bytes // max(row_bytes, 1), 1))
+
+    # note: only the sample is cast to the dataset dtype
+    sample = np.ascontiguousarray(sample[:sample_rows], dtype=dtype)
+    if sample.ndim == 0 or sample.shape[0] == 0:
+        raise ValueError('cannot tune on an empty sample')
+
+    results = []
+    for chunks, filters in itertools.product(
+            candidate_chunks(sample.shape, sample.dtype, maxshape), FILTERS):
+        result = trial(sample, chunks, *filters, access, maxshape)
+        results.append(result)
+
+        if verbose:
+            print('tuning: chunks {chunks}, {compression} {compression_opts}, '
+                  'shuffle {shuffle}: write {write_mb_s:.1f} MB/s, '
+                  'read {read_mb_s:.1f} MB/s, ratio {ratio:.2f}'.format(**result))
+
+    # each metric is normalized against the best candidate
+    best_write = min(r['write_time'] for r in results)
+    best_read = min(r['read_time'] for r in results)
+    best_size = min(r['storage_size'] for r in results)
+
+    def cost(result):
+        return (weights[0] * result['write_time'] / best_write +
+                weights[1] * result['read_time'] / best_read +
+                weights[2] * result['storage_size'] / max(best_size, 1))
+
+    best = min(results, key=cost)
+    best['sample_rows'] = len(sample)
+    return best
+
+
+def dataset_kwargs(config):
+    # convert a tuned configuration into create_dataset arguments
+    if config is None:
+        return {}
+
+    return {
+        'chunks': tuple(config['chunks']),
+        'compression': config['compression'],
+        'compression_opts': config['compression_opts'],
+        'shuffle': config['shuffle'],
+    }
+
+
+def record_tuning(dataset, config):
+    # store the chosen configuration and its measurements in the dataset attrs
+    if config is not None:
+        dataset.attrs['tuning'] = json.dumps(config)
+
+
+def load_tuning(dataset):
+    return json.loads(dataset.attrs['tuning']) if 'tuning' in dataset.attrs else None
@@ -0,0 +1,275 @@
+import os
+import re
+import glob
+import h5py
+import numpy as np
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+
+from h5py_examples.memmap import memmap
+
+
+def natural_key(filename):
+    # sorts data_2.h5 before data_10.h5
+    return [int(part) if part.isdigit() else part
+            for part in re.split(r'(\d+)', filename)]
+
+
+def discover_shards(pattern):
+    return sorted(glob.glob(pattern), key=natural_key)
+
+
+def shard_metadata(filename, dataset_name='data'):
+    # only the dataset header is read, no data
+    with h5py.File(filename, 'r') as h5f:
+        dataset = h5f[dataset_name]
+        return dataset.shape, dataset.dtype.str
+
+
+def read_shard_metadata(filenames, dataset_name='data', workers=None):
+    # shard headers are read concurrently in separate processes
+    # note: h5py serializes calls within a process, so threads would not help
+    if workers == 0 or len(filenames) < 2:
+        return [shard_metadata(filename, dataset_name) for filename in filenames]
+
+    workers = workers or os.cpu_count()
+    chunksize = max(len(filenames) // (4 * workers), 1)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(shard_metadata, filenames,
+                                 [dataset_name] * len(filenames),
+                                 chunksize=chunksize))
+
+
+def source_path(h5f, filename):
+    # sources are stored relative to the virtual dataset file
+    # note: hdf5 resolves relative source paths against the vds file location
+    return os.path.relpath(filename, os.path.dirname(os.path.abspath(h5f.filename)))
+
+
+def build_layout(sources, dtype):
+    # sources is a list of (filename, dataset name, shape, rows) stacked along axis 0
+    # note: rows are the (start, stop) source rows mapped, None maps all of them
+    row_shapes = {tuple(shape[1:]) for _, _, shape, _ in sources}
+    if len(row_shapes) != 1:
+        raise ValueError(f'shards have incompatible shapes: {sorted(row_shapes)}')
+    row_shape = row_shapes.pop()
+
+    # cumulative length used for indexing
+    offsets = np.cumsum([0] + [shape[0] if rows is None else rows[1] - rows[0]
+                               for _, _, shape, rows in sources])
+
+    # create a layout defining type and shape of the virtual datatset
+    # note: layout supports resizable datasets
+    layout = h5py.VirtualLayout(shape=(int(offsets[-1]),) + row_shape,
+                                maxshape=(None,) + row_shape, dtype=dtype)
+
+    # create a virtual source for each shard
+    for (filename, name, shape, rows), start, end in zip(sources, offsets[:-1], offsets[1:]):
+        source = h5py.VirtualSource(filename, name=name, shape=shape)
+        layout[start:end, ...] = source if rows is None else source[rows[0]:rows[1], ...]
+
+    return layout
+
+
+def create_virtual_dataset(h5f, name, filenames, source_name='data', workers=None,
+                           fillvalue=-1.):
+    # read shard shapes, then emit the layout in one pass
+    metadata = read_shard_metadata(filenames, source_name, workers)
+    dtypes = {dtype for _, dtype in metadata}
+    if len(dtypes) != 1:
+        raise ValueError(f'shards have different dtypes: {sorted(dtypes)}')
+
+    sources = [(source_path(h5f, filename), source_name, shape, None)
+               for filename, (shape, _) in zip(filenames, metadata)]
+    layout = build_layout(sources, dtypes.pop())
+
+    # create the virtual dataset using layout
+    return h5f.create_virtual_dataset(name, layout, fillvalue=fillvalue)
+
+
+def selected_block(space, row_shape):
+    # (start row, rows) of a selection of whole rows forming one block,
+    # None for any other selection, e.g. strided, point or unlimited ones
+    try:
+        start, end = space.get_select_bounds()
+    except ValueError:
+        return None
+    extent = tuple(e - s + 1 for s, e in zip(start, end))
+    if space.get_select_npoints() != np.prod(extent, dtype=np.int64) or \
+            any(start[1:]) or extent[1:] != tuple(row_shape):
+        return None
+    return start[0], extent[0]
+
+
+def mapping_block(dataset, vmap):
+    # (virtual start row, source start row, rows, source shape) of a mapping
+    # between blocks of whole rows, None for any other mapping
+    block = selected_block(vmap.vspace, dataset.shape[1:])
+    if block is None:
+        return None
+    virtual_start, rows = block
+
+    # note: a source mapped whole is stored as an all selection without
+    # extent, its shape is the extent of the virtual selection
+    if vmap.src_space.get_select_type() == h5py.h5s.SEL_ALL:
+        return virtual_start, 0, rows, (rows,) + dataset.shape[1:]
+
+    source_shape = vmap.src_space.shape
+    block = selected_block(vmap.src_space, source_shape[1:])
+    if block is None or block[1] != rows:
+        return None
+    return virtual_start, block[0], rows, source_shape
+
+
+def mapped_sources(dataset):
+    # (filename, dataset name, shape, rows) of each mapping, in virtual row order
+    # note: rows are the (start, stop) source rows mapped, so build_layout
+    # recreates the mappings as stored
+    sources = []
+    for vmap in dataset.virtual_sources():
+        block = mapping_block(dataset, vmap)
+        if block is None:
+            raise ValueError(f'{dataset.name} maps {vmap.file_name}:{vmap.dset_name} '
+                             'other than by blocks of rows')
+        virtual_start, source_start, rows, shape = block
+        sources.append((virtual_start, (vmap.file_name, vmap.dset_name, shape,
+                                        (source_start, source_start + rows))))
+    return [source for _, source in sorted(sources, key=lambda s: s[0])]
+
+
+def extend_virtual_dataset(h5f, name, filenames, source_name='data', workers=None):
+    dataset = h5f[name]
+    sources = mapped_sources(dataset)
+
+    # only shards that are not mapped yet are inspected
+    mapped = {filename for filename, *_ in sources}
+    new_filenames = [filename for filename in filenames
+                     if source_path(h5f, filename) not in mapped]
+    if not new_filenames:
+        return dataset
+
+    metadata = read_shard_metadata(new_filenames, source_name, workers)
+    if any(np.dtype(dtype) != dataset.dtype for _, dtype in metadata):
+        raise ValueError(f'new shards do not match the dtype of {dataset.name}')
+
+    sources += [(source_path(h5f, filename), source_name, shape, None)
+                for filename, (shape, _) in zip(new_filenames, metadata)]
+
+    # existing mappings are reused as stored, shards are not reopened
+    # note: hdf5 cannot add mappings to a virtual dataset, so it is recreated
+    layout = build_layout(sources, dataset.dtype)
+    fillvalue = dataset.fillvalue
+    attrs = dict(dataset.attrs)
+    del h5f[name]
+
+    dataset = h5f.create_virtual_dataset(name, layout, fillvalue=fillvalue)
+    dataset.attrs.update(attrs)
+    return dataset
+
+
+def read_shard(filename, dataset_name, selection, out_name, out_shape, out_dtype, out_rows):
+    # reads a shard selection straight into the shared output array
+    out_memory = shared_memory.SharedMemory(name=out_name)
+    try:
+        out = np.ndarray(out_shape, dtype=out_dtype, buffer=out_memory.buf)
+        with h5py.File(filename, 'r') as h5f:
+            # note: contiguous shards are copied from a memory map, skipping
+            # the hdf5 read path; other layouts are read through hdf5
+            mapped = memmap(h5f[dataset_name])
+            if mapped is not None:
+                out[out_rows] = mapped[selection]
+                del mapped
+            else:
+                h5f[dataset_name].read_direct(out, selection, np.s_[out_rows])
+        del out
+    finally:
+        out_memory.close()
+
+
+def shard_selections(dataset, start, stop, selection=()):
+    # splits rows [start, stop) of a virtual dataset into per-shard reads
+    # note: returns (source filename, dataset name, source selection, output
+    # rows) of each read, or None when a mapping is not a block of rows
+    base = os.path.dirname(os.path.abspath(dataset.file.filename))
+
+    reads = []
+    for vmap in dataset.virtual_sources():
+        block = mapping_block(dataset, vmap)
+        if block is None:
+            return None
+
+        first, source_first, rows, _ = block
+        lo, hi = max(start, first), min(stop, first + rows)
+        if lo >= hi:
+            continue
+
+        # the same file is written as '.' in the mapping
+        filename = dataset.file.filename if vmap.file_name == '.' \
+            else os.path.join(base, vmap.file_name)
+
+        # note: source rows are offset by where the mapping starts in the source
+        offset = source_first - first
+        reads.append((lo, (filename, vmap.dset_name,
+                           (slice(lo + offset, hi + offset),) + tuple(selection),
+                           slice(lo - start, hi - start))))
+    return [read for _, read in sorted(reads, key=lambda read: read[0])]
+
+
+def read_virtual(dataset, rows=slice(None), selection=(), executor=None,
+                 min_rows=65536):
+    # reads dataset[rows, *selection] from the shards behind a virtual dataset
+    # note: shards are read concurrently by a process pool into one
+    # preallocated array; small or single-shard reads, and mappings other
+    # than blocks of rows, e.g. strided ones, use the vds directly
+    start, stop, step = rows.indices(dataset.shape[0])
+    if step != 1:
+        raise ValueError('only contiguous row selections are supported')
+    selection = selection if isinstance(selection, tuple) else (selection,)
+
+    if stop - start < min_rows or not dataset.is_virtual:
+        return dataset[(slice(start, stop),) + selection]
+
+    reads = shard_selections(dataset, start, stop, selection)
+    if reads is None or len(reads) < 2:
+        return dataset[(slice(start, stop),) + selection]
+
+    # shape of the output, computed without allocating the rows
+    row_shape = np.broadcast_to(np.empty((), dtype=bool),
+                                dataset.shape[1:])[selection].shape
+
+    shape = (stop - start,) + row_shape
+
+    # output is assembled in shared memory, so shard data is not pickled
+    out_memory = shared_memory.SharedMemory(
+        create=True, size=max(int(np.prod(shape)) * dataset.dtype.itemsize, 1))
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=min(len(reads), os.cpu_count()))
+
+    try:
+        shared = np.ndarray(shape, dtype=dataset.dtype, buffer=out_memory.buf)
+
+        # rows not covered by any shard keep the fill value
+        covered = np.zeros(len(shared), dtype=bool)
+        for *_, rows in reads:
+            covered[rows] = True
+        if not covered.all():
+            shared[~covered] = dataset.fillvalue
+
+        futures = [executor.submit(read_shard, filename, name, source_selection,
+                                   out_memory.name, shape, dataset.dtype.str, rows)
+                   for filename, name, source_selection, rows in reads]
+        for future in futures:
+            future.result()
+
+        # copy out of shared memory before it is released
+        out = shared.copy()
+        del shared
+    finally:
+        if own_executor:
+            executor.shutdown()
+        out_memory.close()
+        out_memory.unlink()
+
+    return out
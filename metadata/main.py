@@ -1,6 +1,14 @@
+import sys
 import h5py
 import argparse
 import numpy as np
+from pathlib import Path
+
+# note: makes the shared h5py_examples package importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from h5py_examples import metadata as md  # noqa: E402
+from h5py_examples import instrument  # noqa: E402
 
 
 def main():
@@ -12,8 +20,13 @@ def main():
     parser.add_argument('-m', '--metadata', action='append', nargs='+',
                         type=lambda kv: tuple(kv.split('=')), dest='metadata',
                         help='sequence of key value pairs (i.e.: a=2 b="a long message")')
+    parser.add_argument('-q', '--query', type=lambda kv: tuple(kv.split('=')),
+                        help='key value pair to look up in the attribute index (i.e.: a=2)')
+    instrument.add_arguments(parser)
     args = parser.parse_args()
 
+    instrument.from_args(args)
+
     # convert metadata to dict
     metadata = dict(args.metadata[0]) if args.metadata is not None else dict()
 
@@ -25,19 +38,23 @@ def main():
         # create an empty dataset of long ints
         dataset = h5f.create_dataset(name=args.dataset_name, dtype='i8')
 
-        # iterate over metadata
-        for k, v in metadata.items():
-            dataset.attrs[k] = v
+        # set all metadata in one call, which also updates the attribute index
+        # note: many objects can be tagged at once, i.e. {path: metadata, ...}
+        md.set_attrs(h5f, {dataset.name: metadata})
 
     # open hdf5 file in read mode
     with h5py.File(args.filename, 'r') as h5f:
-        # select dataset
-        dataset = h5f[args.dataset_name]
+        # get dataset metadata
+        attrs = md.get_attrs(h5f, [args.dataset_name])[args.dataset_name]
 
         # print dataset metadata
-        for k, v in dataset.attrs.items():
+        for k, v in attrs.items():
             print(k, '=', v)
 
+        # find objects by metadata using the index, without opening them
+        if args.query is not None:
+            print('matching objects:', md.query(h5f, *args.query))
+
 
 if __name__ == '__main__':
     main()
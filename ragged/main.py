@@ -1,6 +1,82 @@
+import os
+import sys
+import time
 import h5py
 import argparse
+import tempfile
 import numpy as np
+from pathlib import Path
+
+# note: makes the shared h5py_examples package importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from h5py_examples.ragged import PackedRagged, write_packed  # noqa: E402
+from h5py_examples import instrument  # noqa: E402
+from h5py_examples import bench  # noqa: E402
+
+
+def write_vlen(h5f, name, arrays):
+    # create ragged data
+    data = np.empty(len(arrays), dtype=object)
+    data[:] = arrays
+
+    # create a dataset of ragged floats
+    # note: i didn't find a way to store data directly with create_dataset
+    dataset = h5f.create_dataset(name=name,
+                                 shape=data.shape,
+                                 dtype=h5py.special_dtype(vlen=np.float32))
+
+    # store data row by row
+    for i in range(len(data)):
+        dataset[i] = data[i]
+
+    return dataset
+
+
+def benchmark(args):
+    # random ragged arrays
+    rng = np.random.default_rng()
+    lengths = rng.integers(0, args.benchmark_max_length, args.benchmark_rows)
+    arrays = [rng.random(length, dtype=np.float32) for length in lengths]
+
+    print(f'{"format":>12} {"write (s)":>10} {"read (s)":>10} {"row (us)":>10} {"size (MB)":>10}')
+
+    with tempfile.TemporaryDirectory() as directory:
+        for format_name in ('vlen', 'packed', 'packed-gzip'):
+            filename = os.path.join(directory, f'{format_name}.h5')
+
+            start = time.perf_counter()
+            with h5py.File(filename, 'w') as h5f:
+                if format_name == 'vlen':
+                    write_vlen(h5f, 'data', arrays)
+                elif format_name == 'packed':
+                    write_packed(h5f, 'data', arrays, dtype=np.float32)
+                else:
+                    write_packed(h5f, 'data', arrays, dtype=np.float32,
+                                 compression='gzip', shuffle=True)
+            write_time = time.perf_counter() - start
+
+            with h5py.File(filename, 'r') as h5f:
+                ragged = h5f['data'] if format_name == 'vlen' \
+                    else PackedRagged(h5f['data'])
+
+                # bulk read
+                start = time.perf_counter()
+                data = ragged[...] if format_name == 'vlen' else ragged.read()
+                read_time = time.perf_counter() - start
+
+                # random row access
+                rows = rng.integers(0, len(arrays), 1000)
+                start = time.perf_counter()
+                for row in rows:
+                    ragged[row]
+                row_time = (time.perf_counter() - start) / len(rows)
+
+                assert all(np.array_equal(data[row], arrays[row]) for row in rows)
+
+            size = os.path.getsize(filename)
+            print(f'{format_name:>12} {write_time:>10.3f} {read_time:>10.3f} '
+                  f'{row_time * 1e6:>10.1f} {size / 1e6:>10.2f}')
 
 
 def main():
@@ -12,33 +88,56 @@ def main():
     parser.add_argument('-a', '--arrays', type=str, nargs='+',
                         help='arrays to be stored (i.e.: "[0]" "[1,2,3]" "[10,20,30,40,50]")',
                         default=['[0]', '[1, 2, 3]', '[10, 20, 30, 40, 50]'])
+    parser.add_argument('-g', '--generate', type=int,
+                        help='store this many random arrays instead of --arrays')
+    parser.add_argument('-fmt', '--format', type=str, choices=['vlen', 'packed'],
+                        help='vlen dataset, or flat values plus offsets', default='vlen')
+    parser.add_argument('-b', '--benchmark', action='store_true',
+                        help='compare write time, read time and size of the formats')
+    parser.add_argument('-br', '--benchmark-rows', type=int,
+                        help='ragged arrays used by the benchmark', default=100000)
+    parser.add_argument('-bl', '--benchmark-max-length', type=int,
+                        help='maximum length of the benchmark arrays', default=100)
+    instrument.add_arguments(parser)
+    bench.add_arguments(parser)
     args = parser.parse_args()
 
+    instrument.from_args(args)
+    bench.from_args(args)
+
+    if args.benchmark:
+        benchmark(args)
+        return
+
     # open hdf5 file in write mode
     with h5py.File(args.filename, 'w') as h5f:
         # create ragged data
-        data = np.array([eval(arr) for arr in args.arrays], dtype=object)
+        # note: generated arrays are up to 32 values long
+        if args.generate:
+            rng = np.random.default_rng(0)
+            arrays = [rng.random(length, dtype=np.float32)
+                      for length in rng.integers(1, 33, args.generate)]
+        else:
+            arrays = [np.array(eval(arr), dtype=np.float32) for arr in args.arrays]
 
-        # create a dataset of ragged floats
-        # note: i didn't find a way to store data directly with create_dataset
-        dataset = h5f.create_dataset(name=args.dataset_name,
-                                     shape=data.shape,
-                                     dtype=h5py.special_dtype(vlen=np.float32))
-
-        # store data row by row
-        for i in range(len(data)):
-            dataset[i] = data[i]
+        with bench.timed():
+            if args.format == 'vlen':
+                write_vlen(h5f, args.dataset_name, arrays)
+            else:
+                # note: all arrays are written with one call
+                write_packed(h5f, args.dataset_name, arrays, dtype=np.float32)
 
     # open hdf5 file in read mode
     with h5py.File(args.filename, 'r') as h5f:
-        # select dataset
-        dataset = h5f[args.dataset_name]
-
         # access data
-        data = dataset[...]
+        with bench.timed():
+            if args.format == 'vlen':
+                data = h5f[args.dataset_name][...]
+            else:
+                data = PackedRagged(h5f[args.dataset_name]).read()
 
         # print data
-        print(data)
+        print(data if not args.generate else f'{len(data)} arrays read')
 
 
 if __name__ == '__main__':
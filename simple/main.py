@@ -1,6 +1,51 @@
+import os
+import sys
+import time
 import h5py
 import argparse
+import tempfile
 import numpy as np
+from pathlib import Path
+
+# note: makes the shared h5py_examples package importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from h5py_examples import tuning  # noqa: E402
+from h5py_examples.reduce import reduce  # noqa: E402
+from h5py_examples.memmap import as_array, memmap  # noqa: E402
+from h5py_examples import instrument  # noqa: E402
+from h5py_examples import bench  # noqa: E402
+
+
+def benchmark(args):
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'benchmark.h5')
+
+        # contiguous, uncompressed dataset
+        with h5py.File(filename, 'w') as h5f:
+            h5f.create_dataset(name='data', dtype='f4',
+                               data=np.random.rand(*args.benchmark_shape))
+
+        with h5py.File(filename, 'r') as h5f:
+            dataset = h5f['data']
+            mapped = memmap(dataset)
+            rows = np.random.randint(0, dataset.shape[0], args.benchmark_rows)
+
+            print(f'{"read":>8} {"full scan (s)":>14} {"row (us)":>10}')
+            for name, array in (('hdf5', dataset), ('memmap', mapped)):
+                start = time.perf_counter()
+                total = array[...].sum()
+                scan_time = time.perf_counter() - start
+
+                start = time.perf_counter()
+                for row in rows:
+                    array[row]
+                row_time = (time.perf_counter() - start) / len(rows)
+
+                print(f'{name:>8} {scan_time:>14.3f} {row_time * 1e6:>10.2f}')
+                assert np.isclose(total, dataset[...].sum())
+
+            del mapped
 
 
 def main():
@@ -11,18 +56,56 @@ def main():
                         help='name of the hdf5 dataset', default='data')
     parser.add_argument('-s', '--shape', type=int, nargs='+',
                         help='shape of the hdf5 dataset', default=[5, 100])
+    parser.add_argument('-t', '--tune', action='store_true',
+                        help='pick chunk shape and compression from a trial on the data')
+    parser.add_argument('-a', '--access', type=str, choices=tuning.ACCESS_PATTERNS,
+                        help='access pattern the dataset is tuned for', default='rows')
+    parser.add_argument('-ax', '--axis', type=int,
+                        help='axis the statistics are computed along, all values by default')
+    parser.add_argument('-hb', '--bins', type=int,
+                        help='number of histogram bins, no histogram by default')
+    parser.add_argument('-w', '--workers', type=int,
+                        help='processes reducing blocks of the dataset', default=0)
+    parser.add_argument('-mm', '--mmap', action='store_true',
+                        help='read the data through a memory map when the layout allows it')
+    parser.add_argument('-b', '--benchmark', action='store_true',
+                        help='compare hdf5 reads with memory mapped reads')
+    parser.add_argument('-bs', '--benchmark-shape', type=int, nargs='+',
+                        help='shape of the benchmark dataset', default=[int(1e6), 42])
+    parser.add_argument('-br', '--benchmark-rows', type=int,
+                        help='random rows read by the benchmark', default=10000)
+    instrument.add_arguments(parser)
+    bench.add_arguments(parser)
     args = parser.parse_args()
 
+    instrument.from_args(args)
+    bench.from_args(args)
+
+    if args.benchmark:
+        benchmark(args)
+        return
+
     # open hdf5 file in write mode
     with h5py.File(args.filename, 'w') as h5f:
         # create random data to be stored
         data = np.random.rand(*args.shape)
 
+        # optionally tune chunking and filters on the data
+        config = tuning.tune(data, dtype='f4', access=args.access) \
+            if args.tune else None
+
         # create a dataset of floats (f4) and store data
-        dataset = h5f.create_dataset(name=args.dataset_name,
-                                     shape=tuple(args.shape),
-                                     dtype='f4',
-                                     data=data)
+        with bench.timed():
+            dataset = h5f.create_dataset(name=args.dataset_name,
+                                         shape=tuple(args.shape),
+                                         dtype='f4',
+                                         data=data,
+                                         **tuning.dataset_kwargs(config))
+
+        # record the chosen configuration
+        if config is not None:
+            tuning.record_tuning(dataset, config)
+            print('tuned:', tuning.dataset_kwargs(config))
 
     # open hdf5 file in read mode
     with h5py.File(args.filename, 'r') as h5f:
@@ -32,11 +115,21 @@ def main():
         # select dataset
         dataset = h5f[args.dataset_name]
 
-        # access data
-        data = dataset[...]
+        # access the first row
+        # note: contiguous, unfiltered data is memory mapped instead of
+        # copied through hdf5, other layouts fall back to the dataset
+        if args.mmap:
+            print('first row:', as_array(dataset)[0])
+
+        # process data in chunk-aligned blocks
+        # note: the dataset is never loaded as a whole, so it can exceed memory
+        with bench.timed():
+            stats = reduce(dataset, axis=args.axis, bins=args.bins, workers=args.workers)
 
-        # process data
-        print(data.mean())
+        print(stats['mean'])
+        print('var:', stats['var'], 'min:', stats['min'], 'max:', stats['max'])
+        if args.bins is not None:
+            print('histogram:', stats['hist'])
 
 
 if __name__ == '__main__':
@@ -1,6 +1,72 @@
+import os
+import sys
+import time
 import h5py
 import argparse
+import tempfile
 import numpy as np
+from pathlib import Path
+
+# note: makes the shared h5py_examples package importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from h5py_examples import strings as encodings  # noqa: E402
+from h5py_examples import instrument  # noqa: E402
+from h5py_examples import bench  # noqa: E402
+
+
+def write_vlen(h5f, name, strings, **kwargs):
+    # create string data
+    data = np.array(strings, dtype=object)
+
+    # create a dataset of strings
+    # note: the dtype used here stores variable length strings
+    return h5f.create_dataset(name=name,
+                              shape=data.shape,
+                              dtype=h5py.special_dtype(vlen=str),
+                              data=data,
+                              **kwargs)
+
+
+def benchmark(args):
+    # labels drawn from a limited vocabulary
+    rng = np.random.default_rng()
+    vocabulary = np.array([f'label-{index}-{"x" * (index % 16)}'
+                           for index in range(args.benchmark_unique)])
+    strings = vocabulary[rng.integers(0, len(vocabulary), args.benchmark_rows)]
+
+    writers = {
+        'vlen': lambda h5f: write_vlen(h5f, 'data', strings, compression='gzip'),
+        'fixed': lambda h5f: encodings.write_fixed(h5f, 'data', strings, compression='gzip'),
+        'dictionary': lambda h5f: encodings.write_dictionary(h5f, 'data', strings,
+                                                             compression='gzip'),
+    }
+    readers = {
+        'vlen': lambda h5f: h5f['data'].asstr()[...],
+        'fixed': lambda h5f: encodings.read_fixed(h5f['data']),
+        'dictionary': lambda h5f: encodings.DictionaryStrings(h5f['data']).read(),
+    }
+
+    print(f'{"encoding":>12} {"write (s)":>10} {"read (s)":>10} {"size (MB)":>10}')
+
+    with tempfile.TemporaryDirectory() as directory:
+        for encoding, writer in writers.items():
+            filename = os.path.join(directory, f'{encoding}.h5')
+
+            start = time.perf_counter()
+            with h5py.File(filename, 'w') as h5f:
+                writer(h5f)
+            write_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            with h5py.File(filename, 'r') as h5f:
+                data = readers[encoding](h5f)
+            read_time = time.perf_counter() - start
+
+            assert np.array_equal(np.asarray(data, dtype=str), strings)
+
+            size = os.path.getsize(filename)
+            print(f'{encoding:>12} {write_time:>10.3f} {read_time:>10.3f} {size / 1e6:>10.2f}')
 
 
 def main():
@@ -12,31 +78,60 @@ def main():
     parser.add_argument('-s', '--strings', type=str, nargs='+',
                         help='strings to be stored (i.e.: an example of a "string with spaces")',
                         default=['this', 'is', 'an', 'example'])
+    parser.add_argument('-g', '--generate', type=int,
+                        help='store this many random strings instead of --strings')
+    parser.add_argument('-e', '--encoding', type=str, choices=['vlen', 'fixed', 'dictionary'],
+                        help='variable length, fixed width utf-8 or dictionary encoded strings',
+                        default='vlen')
+    parser.add_argument('-b', '--benchmark', action='store_true',
+                        help='compare write time, read time and size of the encodings')
+    parser.add_argument('-br', '--benchmark-rows', type=int,
+                        help='strings used by the benchmark', default=int(1e6))
+    parser.add_argument('-bu', '--benchmark-unique', type=int,
+                        help='distinct strings used by the benchmark', default=1000)
+    instrument.add_arguments(parser)
+    bench.add_arguments(parser)
     args = parser.parse_args()
 
+    instrument.from_args(args)
+    bench.from_args(args)
+
+    if args.benchmark:
+        benchmark(args)
+        return
+
+    # note: generated strings are up to 32 lowercase letters long
+    if args.generate:
+        rng = np.random.default_rng(0)
+        letters = np.array(list('abcdefghijklmnopqrstuvwxyz'))
+        args.strings = [''.join(rng.choice(letters, length))
+                        for length in rng.integers(1, 33, args.generate)]
+
     # open hdf5 file in write mode
-    with h5py.File(args.filename, 'w') as h5f:
-        # create string data
-        data = np.array([args.strings], dtype=object)
-
-        # create a dataset of strings
-        # note: the dtype used here stores variable length strings
-        # note: use 'S10' for fixed size strings of length 10
-        dataset = h5f.create_dataset(name=args.dataset_name,
-                                     shape=data.shape,
-                                     dtype=h5py.special_dtype(vlen=str),
-                                     data=data)
+    with h5py.File(args.filename, 'w') as h5f, bench.timed():
+        if args.encoding == 'vlen':
+            # note: use 'S10' for fixed size strings of length 10
+            write_vlen(h5f, args.dataset_name, [args.strings])
+        elif args.encoding == 'fixed':
+            # note: the width is the longest utf-8 encoded string
+            encodings.write_fixed(h5f, args.dataset_name, args.strings)
+        else:
+            # note: unique strings are stored once, rows store integer codes
+            encodings.write_dictionary(h5f, args.dataset_name, args.strings)
 
     # open hdf5 file in read mode
     with h5py.File(args.filename, 'r') as h5f:
-        # select dataset
-        dataset = h5f[args.dataset_name]
-
         # access data
-        data = dataset[...]
+        with bench.timed():
+            if args.encoding == 'vlen':
+                data = h5f[args.dataset_name][...]
+            elif args.encoding == 'fixed':
+                data = encodings.read_fixed(h5f[args.dataset_name])
+            else:
+                data = encodings.DictionaryStrings(h5f[args.dataset_name]).read()
 
         # print data
-        print(data)
+        print(data if not args.generate else f'{np.size(data)} strings read')
 
 
 if __name__ == '__main__':
@@ -1,63 +1,90 @@
+import sys
+import time
 import h5py
 import argparse
 import numpy as np
-from multiprocessing import Process, Event
+from pathlib import Path
+from multiprocessing import Process
+
+# note: makes the shared h5py_examples package importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from h5py_examples import tuning  # noqa: E402
+from h5py_examples.swmr import (CoalescingWriter, FlushPolicy, FLUSH_POLICIES,  # noqa: E402
+                                 SwmrTail, open_swmr)
+from h5py_examples import instrument  # noqa: E402
+from h5py_examples import bench  # noqa: E402
 
 
 class SwmrReader(Process):
-    def __init__(self, event, args, timeout=1.0):
+    def __init__(self, args, timeout=1.0):
         super(SwmrReader, self).__init__()
-        self.event = event
         self.args = args
         self.timeout = timeout
 
-    def timeout_wait(self, t=None):
-        response = self.event.wait(t if t is not None else self.timeout)
-        self.event.clear()
-        return response
-
     def run(self):
-        # wait for initial signal: dataset has been created
-        self.timeout_wait()
-
         # open hdf5 file in read mode, with latest lib version and swmr=True
         # note: without libver='latest' SWMR will not work
-        self.h5f = h5py.File(self.args.filename, 'r',
-                             libver='latest', swmr=True)
+        # note: no signal is needed, opening is retried until the writer
+        # has activated swmr mode
+        self.h5f = open_swmr(self.args.filename)
 
         # select dataset
         self.dataset = self.h5f[self.args.dataset_name]
 
-        # while signals arrive before timeout
-        while self.timeout_wait():
-            # refresh dataset
-            self.dataset.refresh()
+        # tail the dataset until no rows arrive before timeout
+        tail = SwmrTail(self.dataset, idle_timeout=self.timeout)
+        latencies = []
+        for start, block in tail:
+            print('new rows:', start, '-', start + len(block))
 
-            # get current shape
-            shape = self.dataset.shape
-            print('new shape:', shape)
+            # rows carry the time they were written in their first column
+            if self.args.latency:
+                now = time.time() - self.args.epoch
+                latencies.append(now - block[:, 0])
+
+        print(f'read {tail.rows} rows in {tail.blocks} blocks and {tail.polls} polls, '
+              f'{tail.rows_per_second:,.0f} rows/s')
+
+        if latencies:
+            latencies = np.concatenate(latencies)
+            print(f'latency: mean {latencies.mean() * 1e3:.2f} ms, '
+                  f'max {latencies.max() * 1e3:.2f} ms')
 
         # close hdf5 file
         self.h5f.close()
 
+        # note: processes exit without atexit handlers, the profile is printed here
+        instrument.report()
+
 
 class SwmrWriter(Process):
-    def __init__(self, event, args):
+    def __init__(self, args):
         super(SwmrWriter, self).__init__()
-        self.event = event
         self.args = args
         self.data = np.random.rand(self.args.length, 42)
 
+        # optionally tune chunking and filters on a sample of the data
+        # note: tuning runs before the processes start, so the reader does
+        # not wait on the trials
+        self.config = tuning.tune(self.data, dtype='f4', access=self.args.access,
+                                  maxshape=(None, 42)) if self.args.tune else None
+
     def run(self):
         # open hdf5 file in write mode, with latest lib version
         # note: without libver='latest' SWMR will not work
         self.h5f = h5py.File(self.args.filename, 'w', libver='latest')
 
         # create an empty dataset of floats
-        self.h5f.create_dataset(name=self.args.dataset_name,
-                                shape=(0, 42),
-                                maxshape=(None, 42),
-                                dtype='f4')
+        dataset = self.h5f.create_dataset(name=self.args.dataset_name,
+                                          shape=(0, 42),
+                                          maxshape=(None, 42),
+                                          dtype='f4',
+                                          **tuning.dataset_kwargs(self.config))
+
+        # record the tuned configuration
+        # note: attributes must be written before swmr mode is activated
+        tuning.record_tuning(dataset, self.config)
 
         # flush buffers, saves file to disk
         self.h5f.flush()
@@ -69,35 +96,33 @@ class SwmrWriter(Process):
         # select dataset
         self.dataset = self.h5f[self.args.dataset_name]
 
-        # send event to other process
-        self.event.set()
-
-        # iterate over data, appending to dataset
-        for _ in range(0, self.args.length, self.args.batch_size):
-            # compute new shape
-            current_length = self.dataset.shape[0]
-            new_length = min(current_length +
-                             self.args.batch_size, self.args.length)
-            new_shape = (new_length,) + self.dataset.shape[1:]
-
-            # resize dataset
-            self.dataset.resize(new_shape)
-
-            # get batch of data
-            batch = self.data[current_length:new_length, ...]
+        # rows are coalesced and flushed according to the flush policy
+        policy = FlushPolicy(self.args.flush_policy, rows=self.args.flush_rows,
+                             interval=self.args.flush_interval)
+        with CoalescingWriter(self.dataset, policy) as writer:
+            # iterate over data, appending to dataset
+            for start in range(0, self.args.length, self.args.batch_size):
+                # get batch of data
+                batch = self.data[start:start + self.args.batch_size, ...]
 
-            # append a batch of data
-            self.dataset[current_length:, ...] = batch
+                # stamp rows with the time they are produced
+                if self.args.latency:
+                    batch[:, 0] = time.time() - self.args.epoch
 
-            # flush changes to file
-            self.dataset.flush()
+                # append a batch of data
+                writer.append(batch)
 
-            # send event to other process
-            self.event.set()
+        # print flush counters
+        flush_bytes = np.array(writer.flush_bytes, dtype=np.int64)
+        print(f'{writer.flushes} flushes, {flush_bytes.sum() / 1e6:.1f} MB written, '
+              f'{flush_bytes.sum() / max(writer.flushes, 1) / 1e6:.2f} MB per flush')
 
         # close hdf5 file
         self.h5f.close()
 
+        # note: processes exit without atexit handlers, the profile is printed here
+        instrument.report()
+
 
 def main():
     parser = argparse.ArgumentParser()
@@ -109,22 +134,45 @@ def main():
                         help='length of the hdf5 dataset', default=int(1e6))
     parser.add_argument('-bs', '--batch-size', type=int,
                         help='length of the batch appended to the dataset', default=int(1e5))
+    parser.add_argument('-t', '--tune', action='store_true',
+                        help='pick chunk shape and compression from a trial on the data')
+    parser.add_argument('-a', '--access', type=str, choices=tuning.ACCESS_PATTERNS,
+                        help='access pattern the dataset is tuned for', default='rows')
+    parser.add_argument('-lt', '--latency', action='store_true',
+                        help='stamp rows with their write time to measure reader latency')
+    parser.add_argument('-fp', '--flush-policy', type=str, choices=FLUSH_POLICIES,
+                        help='when appended rows are flushed to readers', default='batch')
+    parser.add_argument('-fr', '--flush-rows', type=int,
+                        help='rows coalesced before a size flush', default=int(1e5))
+    parser.add_argument('-fi', '--flush-interval', type=float,
+                        help='seconds between time flushes', default=0.1)
+    instrument.add_arguments(parser)
+    bench.add_arguments(parser)
     args = parser.parse_args()
 
-    # create event to send signals between processes
-    event = Event()
+    instrument.from_args(args)
+    bench.from_args(args)
+
+    # reference time shared by both processes
+    args.epoch = time.time()
+
+    # remove a previous file, so the reader cannot open it
+    Path(args.filename).unlink(missing_ok=True)
 
     # create reader and writer processes
-    writer = SwmrWriter(event, args)
-    reader = SwmrReader(event, args)
+    writer = SwmrWriter(args)
+    reader = SwmrReader(args)
 
     # run processes
+    # note: the core path ends with the writer, the reader then waits for
+    # its idle timeout
     reader.start()
-    writer.start()
+    with bench.timed():
+        writer.start()
+        writer.join()
 
     # wait for processes to end
     reader.join()
-    writer.join()
 
 
 if __name__ == '__main__':
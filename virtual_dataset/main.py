@@ -1,6 +1,111 @@
+import os
+import sys
+import time
 import h5py
 import argparse
+import tempfile
 import numpy as np
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+# note: makes the shared h5py_examples package importable when run as a script
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from h5py_examples import vds  # noqa: E402
+from h5py_examples.memmap import as_array  # noqa: E402
+from h5py_examples import instrument  # noqa: E402
+from h5py_examples import bench  # noqa: E402
+
+
+def parse_columns(text):
+    # parses a column selection such as '0', '0:8' or ':'
+    if ':' not in text:
+        return int(text)
+    return slice(*[int(part) if part else None for part in text.split(':')])
+
+
+def benchmark(args):
+    print(f'{"shards":>8} {"columns":>8} {"direct (s)":>12} {"parallel (s)":>13} {"speedup":>8}')
+
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor, \
+            tempfile.TemporaryDirectory() as directory:
+        for shards in args.benchmark_shards:
+            # create shards and the virtual dataset stitching them
+            filenames = [os.path.join(directory, f'data_{shards}_{index}.h5')
+                         for index in range(shards)]
+            for filename in filenames:
+                with h5py.File(filename, 'w') as h5f:
+                    h5f.create_dataset(name='data', dtype='f4',
+                                       data=np.random.rand(args.benchmark_rows, 42))
+
+            filename = os.path.join(directory, f'vds_{shards}.h5')
+            with h5py.File(filename, 'w', libver='latest') as h5f:
+                vds.create_virtual_dataset(h5f, 'data', filenames)
+
+            with h5py.File(filename, 'r') as h5f:
+                dataset = h5f['data']
+
+                for columns in args.benchmark_columns:
+                    selection = parse_columns(columns)
+
+                    start = time.perf_counter()
+                    direct = dataset[:, selection]
+                    direct_time = time.perf_counter() - start
+
+                    start = time.perf_counter()
+                    parallel = vds.read_virtual(dataset, selection=selection,
+                                                executor=executor, min_rows=0)
+                    parallel_time = time.perf_counter() - start
+
+                    assert np.array_equal(direct, parallel)
+                    print(f'{shards:>8} {columns:>8} {direct_time:>12.3f} '
+                          f'{parallel_time:>13.3f} {direct_time / parallel_time:>8.2f}')
+
+            # random row access, through the vds and from a memory mapped shard
+            with h5py.File(filenames[0], 'r') as h5f:
+                dataset = h5f['data']
+                mapped = as_array(dataset)
+                rows = np.random.randint(0, len(dataset), 10000)
+                times = []
+                for array in (dataset, mapped):
+                    start = time.perf_counter()
+                    for row in rows:
+                        array[row]
+                    times.append((time.perf_counter() - start) / len(rows) * 1e6)
+                del mapped
+
+            print(f'{shards:>8} random row: hdf5 {times[0]:.2f} us, memmap {times[1]:.2f} us')
+
+
+async def serve(args, filenames):
+    # concurrent requests for row slices of random shards
+    # note: requests repeat, as a service sees for popular slices
+    import asyncio
+    from h5py_examples.aio import AsyncReader
+
+    lengths = [shape[0] for shape, _ in vds.read_shard_metadata(filenames, workers=0)]
+    requests = []
+    for _ in range(args.async_reads):
+        index = np.random.randint(len(filenames))
+        start = np.random.randint(max(lengths[index], 1))
+        requests.append((filenames[index], np.s_[start:start + 4]))
+    requests += requests[:len(requests) // 4]
+
+    start = time.perf_counter()
+    async with AsyncReader(workers=args.async_workers, max_open=args.max_open) as reader:
+        results = await asyncio.gather(*(reader.read(filename, 'data', selection)
+                                         for filename, selection in requests))
+        elapsed = time.perf_counter() - start
+        print(f'{len(results)} async reads in {elapsed:.3f}s: {reader.reads} read, '
+              f'{reader.coalesced} coalesced, {reader.opens} opens, '
+              f'{reader.evictions} evictions')
+
+    # the same requests, opening each file per read
+    start = time.perf_counter()
+    for (filename, selection), result in zip(requests, results):
+        with h5py.File(filename, 'r') as h5f:
+            assert np.array_equal(h5f['data'][selection], result)
+    print(f'{len(requests)} sync reads in {time.perf_counter() - start:.3f}s')
 
 
 def main():
@@ -12,48 +117,74 @@ def main():
     parser.add_argument('-ls', '--lengths', type=int, nargs='+',
                         help='lengths of dataset to be stored (i.e.: 2 3 4)',
                         default=[2, 3, 4])
+    parser.add_argument('-p', '--pattern', type=str,
+                        help='glob of existing shard files to stitch, instead of creating them '
+                             '(i.e.: "data_*.h5")')
+    parser.add_argument('-e', '--extend', action='store_true',
+                        help='add shards not yet mapped to an existing virtual dataset')
+    parser.add_argument('-w', '--workers', type=int,
+                        help='processes reading shard shapes, 0 reads them serially')
+    parser.add_argument('-b', '--benchmark', action='store_true',
+                        help='compare direct virtual dataset reads with parallel shard reads')
+    parser.add_argument('-bs', '--benchmark-shards', type=int, nargs='+',
+                        help='numbers of shards used by the benchmark', default=[4, 16, 64])
+    parser.add_argument('-br', '--benchmark-rows', type=int,
+                        help='rows per shard used by the benchmark', default=100000)
+    parser.add_argument('-bc', '--benchmark-columns', type=str, nargs='+',
+                        help='column selections used by the benchmark', default=['0', '0:8', ':'])
+    parser.add_argument('-ar', '--async-reads', type=int,
+                        help='serve random slices of the shards with asyncio', default=0)
+    parser.add_argument('-aw', '--async-workers', type=int,
+                        help='processes of the asyncio reader, each owning the files of some shards', default=4)
+    parser.add_argument('-mo', '--max-open', type=int,
+                        help='files kept open by the asyncio reader', default=64)
+    instrument.add_arguments(parser)
+    bench.add_arguments(parser)
     args = parser.parse_args()
 
-    # create filename for each dataset
-    filenames = [f'data_{index}.h5' for index in range(len(args.lengths))]
-
-    # cumulative length used for indexing
-    cum_lengths = np.cumsum([0] + args.lengths)
-
-    # create a dataset for each length
-    for filename, length in zip(filenames, args.lengths):
-        print(filename, 'created')
-
-        with h5py.File(filename, 'w') as h5f:
-            # create random data to be stored
-            data = np.random.rand(length, 42)
-
-            # create a dataset of floats (f4) and store data
-            h5f.create_dataset(name='data',
-                               shape=data.shape,
-                               dtype='f4',
-                               data=data)
-
-    # open hdf5 file in write mode
-    # note: without libver='latest' virtual dataset will not work
-    with h5py.File(args.filename, 'w', libver='latest') as h5f:
-        # create a layout defining type and shape of the virtual datatset
-        # note: layout supports resizable datasets
-        layout = h5py.VirtualLayout(shape=(sum(args.lengths), 42),
-                                    maxshape=(None, 42), dtype='f4')
-
-        # create a virtual source for each dataset
-        for i, filename in enumerate(filenames):
-            start = cum_lengths[i]
-            end = cum_lengths[i + 1]
-
-            # a virtual source can be a h5py.Dataset or a filename, dataset name and shape
-            vs = h5py.VirtualSource(filename, name='data',
-                                    shape=(args.lengths[i], 42))
-            layout[start:end, ...] = vs
-
-        # create the virtual dataset using layout
-        h5f.create_virtual_dataset(args.dataset_name, layout, fillvalue=-1.)
+    instrument.from_args(args)
+    bench.from_args(args)
+
+    if args.benchmark:
+        benchmark(args)
+        return
+
+    if args.pattern is not None:
+        # discover shards, their lengths are read from the files
+        filenames = vds.discover_shards(args.pattern)
+        print(len(filenames), 'shards found')
+    else:
+        # create filename for each dataset
+        filenames = [f'data_{index}.h5' for index in range(len(args.lengths))]
+
+        # create a dataset for each length
+        for filename, length in zip(filenames, args.lengths):
+            print(filename, 'created')
+
+            with h5py.File(filename, 'w') as h5f:
+                # create random data to be stored
+                data = np.random.rand(length, 42)
+
+                # create a dataset of floats (f4) and store data
+                with bench.timed():
+                    h5f.create_dataset(name='data',
+                                       shape=data.shape,
+                                       dtype='f4',
+                                       data=data)
+
+    if args.extend:
+        # open hdf5 file in append mode and map the new shards
+        with h5py.File(args.filename, 'a', libver='latest') as h5f, bench.timed():
+            vds.extend_virtual_dataset(h5f, args.dataset_name, filenames,
+                                       workers=args.workers)
+    else:
+        # open hdf5 file in write mode
+        # note: without libver='latest' virtual dataset will not work
+        with h5py.File(args.filename, 'w', libver='latest') as h5f, bench.timed():
+            # shard shapes are read in parallel and the layout built in one pass
+            # note: a virtual source can be a h5py.Dataset or a filename, dataset name and shape
+            vds.create_virtual_dataset(h5f, args.dataset_name, filenames,
+                                       workers=args.workers)
 
     # open hdf5 file in read mode
     with h5py.File(args.filename, 'r') as h5f:
@@ -63,7 +194,15 @@ def main():
         print('virtual dataset shape:', dataset.shape)
 
         # print data
-        print('first column:', dataset[:, 0])
+        # note: large selections are read from the shards in parallel
+        with bench.timed():
+            column = vds.read_virtual(dataset, selection=0)
+        print('first column:', column)
+
+    if args.async_reads:
+        # note: asyncio and the reader are only imported when serving
+        import asyncio
+        asyncio.run(serve(args, filenames))
 
 
 if __name__ == '__main__':